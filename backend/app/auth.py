@@ -25,3 +25,13 @@ def decode_access_token(token: str) -> dict | None:
         return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
         return None
+
+
+def subject_from_authorization(header: str | None) -> str | None:
+    """Return the token subject from an ``Authorization: Bearer`` header, if valid."""
+    if not header:
+        return None
+    payload = decode_access_token(header.removeprefix("Bearer ").strip())
+    if not payload or payload.get("sub") is None:
+        return None
+    return str(payload["sub"])
@@ -0,0 +1,181 @@
+"""Branch-aware session routing and cross-branch fan-out.
+
+Titles, copies, holds, transactions and the change feed belong to a
+branch.  ``LIBRARY_BRANCHES`` lists the branches this deployment serves and
+``BRANCH_DATABASE_URLS`` optionally moves branches onto their own
+databases, so each branch's writes take their own lock::
+
+    LIBRARY_BRANCHES=central,north,south
+    BRANCH_DATABASE_URLS=north=sqlite:///./library_north.db,south=sqlite:///./library_south.db
+
+Unlisted branches stay on the primary, and several branches may share one
+URL (on a server database, point each URL at a different schema).  Users,
+memberships and job bookkeeping always live on the primary; a branch
+database only gets ``models.PARTITIONED_TABLES``, which therefore hold
+plain user ids rather than foreign keys to ``users``.  Row ids are
+only unique within one partition, which is why cross-branch output always
+carries the ``branch`` column.
+"""
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+from fastapi import Depends, Header, HTTPException, Query, Request
+from sqlalchemy.orm import Session
+
+from .auth import subject_from_authorization
+from .database import (
+    DATABASE_URL,
+    DEFAULT_BRANCH,
+    LIBRARY_BRANCHES,
+    Base,
+    attribute_writes,
+    partition_engines,
+    partition_session,
+    partition_url,
+    partitions,
+)
+from .dependencies import get_read_db, get_tracked_db
+from .models import PARTITIONED_TABLES
+
+T = TypeVar("T")
+
+# Desk checks (e.g. unpaid fines at issue time) get their own threads, so they
+# never queue behind a report or sweep fanning out over every partition.
+POOL_BULK = "bulk"
+POOL_DESK = "desk"
+DESK_FAN_OUT_WORKERS = int(os.getenv("DESK_FAN_OUT_WORKERS", str(4 * len(partition_engines))))
+
+_executors: dict[str, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def _pool(name: str) -> ThreadPoolExecutor:
+    with _executors_lock:
+        executor = _executors.get(name)
+        if executor is None:
+            workers = DESK_FAN_OUT_WORKERS if name == POOL_DESK else len(partition_engines)
+            executor = _executors[name] = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix=f"branch-fan-out-{name}"
+            )
+        return executor
+
+
+def partition_tables(url: str) -> list | None:
+    """Tables to create in partition ``url``; ``None`` means all of them."""
+    return None if url == DATABASE_URL else PARTITIONED_TABLES
+
+
+def create_partitions() -> None:
+    for url, partition_engine in partition_engines.items():
+        Base.metadata.create_all(bind=partition_engine, tables=partition_tables(url))
+
+
+def validate_branch(branch: str | None) -> str:
+    branch = (branch or DEFAULT_BRANCH).strip()
+    if branch not in LIBRARY_BRANCHES:
+        raise HTTPException(status_code=400, detail=f"Unknown branch {branch}")
+    return branch
+
+
+def current_branch(
+    x_branch: str | None = Header(default=None),
+    branch: str | None = Query(default=None),
+) -> str:
+    """The caller's branch from ``X-Branch`` (or ``?branch=`` for EventSource)."""
+    return validate_branch(x_branch or branch)
+
+
+def _open_branch_session(request: Request, branch: str, read: bool) -> Session:
+    authorization = request.headers.get("authorization")
+    db = partition_session(partition_url(branch), subject_from_authorization(authorization), read=read)
+    attribute_writes(db, authorization)
+    db.info["branch"] = branch
+    return db
+
+
+def get_branch_db(
+    request: Request,
+    branch: str = Depends(current_branch),
+    db: Session = Depends(get_tracked_db),
+):
+    """Write session for the caller's branch.
+
+    For branches on the primary this is the request's ``get_tracked_db`` session, so
+    directory reads and circulation writes still commit together.
+    """
+    if partition_url(branch) == DATABASE_URL:
+        db.info["branch"] = branch
+        yield db
+        return
+    branch_db = _open_branch_session(request, branch, read=False)
+    try:
+        yield branch_db
+    finally:
+        branch_db.close()
+
+
+def get_branch_read_db(
+    request: Request,
+    branch: str = Depends(current_branch),
+    db: Session = Depends(get_read_db),
+):
+    if partition_url(branch) == DATABASE_URL:
+        db.info["branch"] = branch
+        yield db
+        return
+    branch_db = _open_branch_session(request, branch, read=True)
+    try:
+        yield branch_db
+    finally:
+        branch_db.close()
+
+
+def _run_partition(
+    url: str,
+    branches: list[str],
+    fn: Callable[[Session, list[str]], T],
+    subject: str | None,
+    read: bool,
+) -> T:
+    db = partition_session(url, subject, read=read)
+    try:
+        return fn(db, branches)
+    finally:
+        db.close()
+
+
+def fan_out(
+    fn: Callable[[Session, list[str]], T],
+    branches: list[str] | None = None,
+    subject: str | None = None,
+    read: bool = True,
+    pool: str = POOL_BULK,
+) -> list[T]:
+    """Call ``fn(session, branches_in_partition)`` once per partition.
+
+    Partitions run in parallel on a shared thread pool; results come back in
+    partition order.  ``read=False`` skips replicas for callers that write or
+    must see the latest committed state.  Latency-sensitive desk checks pass
+    ``pool=POOL_DESK``.
+    """
+    grouped = partitions(branches)
+    if len(grouped) == 1:
+        (url, names), = grouped.items()
+        return [_run_partition(url, names, fn, subject, read)]
+    # Each worker runs in a copy of the caller's context, so per-request
+    # state such as an active profile follows the queries.
+    futures = [
+        _pool(pool).submit(contextvars.copy_context().run, _run_partition, url, names, fn, subject, read)
+        for url, names in grouped.items()
+    ]
+    return [future.result() for future in futures]
+
+
+def shutdown_fan_out() -> None:
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        _executors.clear()
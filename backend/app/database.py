@@ -1,12 +1,36 @@
+import itertools
 import os
+import threading
+import time
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+
+from .auth import subject_from_authorization
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./library.db")
+# Comma-separated replica URLs; empty means reads go to the primary.
+READ_DATABASE_URLS = [u.strip() for u in os.getenv("READ_DATABASE_URLS", "").split(",") if u.strip()]
+# How long a caller's reads stay on the primary after they commit a write.
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "10"))
+# Branches served by this deployment; the first is the default.
+LIBRARY_BRANCHES = [b.strip() for b in os.getenv("LIBRARY_BRANCHES", "main").split(",") if b.strip()]
+DEFAULT_BRANCH = LIBRARY_BRANCHES[0]
+# Comma-separated branch=url pairs; unlisted branches live on the primary.
+BRANCH_DATABASE_URLS = dict(
+    pair.strip().split("=", 1)
+    for pair in os.getenv("BRANCH_DATABASE_URLS", "").split(",")
+    if pair.strip()
+)
+
+
+def _create_engine(url: str):
+    connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+    return create_engine(url, echo=False, connect_args=connect_args)
 
-connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
-engine = create_engine(DATABASE_URL, echo=False, connect_args=connect_args)
+
+engine = _create_engine(DATABASE_URL)
+read_engines = [_create_engine(url) for url in READ_DATABASE_URLS]
 
 SessionLocal = sessionmaker(
     autocommit=False,
@@ -14,8 +38,64 @@ SessionLocal = sessionmaker(
     bind=engine
 )
 
+ReadSessionLocals = [
+    sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+    for read_engine in read_engines
+]
+# One engine per distinct partition database; branches sharing a URL share it.
+partition_engines = {
+    DATABASE_URL: engine,
+    **{url: _create_engine(url) for url in set(BRANCH_DATABASE_URLS.values()) if url != DATABASE_URL},
+}
+PartitionSessionLocals = {
+    url: SessionLocal if url == DATABASE_URL else sessionmaker(autocommit=False, autoflush=False, bind=partition_engine)
+    for url, partition_engine in partition_engines.items()
+}
+
+_next_replica = itertools.cycle(range(len(ReadSessionLocals)))
+_replica_lock = threading.Lock()
+
 Base = declarative_base()
 
+# caller -> monotonic time of their last committed write.  Per process: with
+# several workers, read-your-writes only holds if a caller's requests stick
+# to one worker (e.g. hash on the Authorization header at the balancer).
+_recent_writers: dict[str, float] = {}
+
+
+@event.listens_for(Session, "after_commit")
+def _remember_writer(session: Session) -> None:
+    authorization = session.info.get("authorization")
+    if not authorization or not session.info.get("dirty"):
+        return
+    subject = subject_from_authorization(authorization)
+    if subject:
+        _recent_writers[subject] = time.monotonic()
+    session.info["dirty"] = False
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_dirty(session: Session, _flush_context) -> None:
+    session.info["dirty"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_bulk_write(orm_execute_state) -> None:
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        orm_execute_state.session.info["dirty"] = True
+
+
+def wrote_recently(subject: str | None) -> bool:
+    if not subject:
+        return False
+    written = _recent_writers.get(subject)
+    if written is None:
+        return False
+    if time.monotonic() - written > READ_YOUR_WRITES_SECONDS:
+        _recent_writers.pop(subject, None)
+        return False
+    return True
+
 
 def get_db():
     db = SessionLocal()
@@ -23,3 +103,38 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def attribute_writes(db: Session, authorization: str | None) -> Session:
+    """Credit ``db``'s commits to the caller, so their reads stay on the primary."""
+    db.info["authorization"] = authorization
+    return db
+
+
+def read_session(subject: str | None = None) -> Session:
+    """Open a session on the next replica, or on the primary if there are
+    none or ``subject`` committed a write within ``READ_YOUR_WRITES_SECONDS``."""
+    if not ReadSessionLocals or wrote_recently(subject):
+        return SessionLocal()
+    with _replica_lock:
+        index = next(_next_replica)
+    return ReadSessionLocals[index]()
+
+
+def partition_url(branch: str) -> str:
+    return BRANCH_DATABASE_URLS.get(branch, DATABASE_URL)
+
+
+def partitions(branches: list[str] | None = None) -> dict[str, list[str]]:
+    """Group ``branches`` (default: all) by the database that holds them."""
+    grouped: dict[str, list[str]] = {}
+    for branch in branches or LIBRARY_BRANCHES:
+        grouped.setdefault(partition_url(branch), []).append(branch)
+    return grouped
+
+
+def partition_session(url: str, subject: str | None = None, read: bool = False) -> Session:
+    """Open a session on partition ``url``; reads of the primary may use a replica."""
+    if read and url == DATABASE_URL:
+        return read_session(subject)
+    return PartitionSessionLocals[url]()
@@ -2,32 +2,50 @@ from typing import Annotated
 from pathlib import Path
 import sys
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 
 try:
-    from app.auth import decode_access_token
-    from app.database import get_db
+    from app.auth import decode_access_token, subject_from_authorization
+    from app.database import SessionLocal, attribute_writes, get_db, read_session
     from app.models import User
 except ImportError:
     if __package__ in (None, ""):
         sys.path.append(str(Path(__file__).resolve().parents[1]))
-        from app.auth import decode_access_token
-        from app.database import get_db
+        from app.auth import decode_access_token, subject_from_authorization
+        from app.database import SessionLocal, attribute_writes, get_db, read_session
         from app.models import User
     else:
-        from .auth import decode_access_token
-        from .database import get_db
+        from .auth import decode_access_token, subject_from_authorization
+        from .database import SessionLocal, attribute_writes, get_db, read_session
         from .models import User
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
-def get_current_user(
-    token: Annotated[str, Depends(oauth2_scheme)],
-    db: Annotated[Session, Depends(get_db)],
-) -> User:
+def get_tracked_db(request: Request, db: Annotated[Session, Depends(get_db)]) -> Session:
+    """The request's ``get_db`` session, with its commits credited to the
+    caller so that ``get_read_db`` keeps their next reads on the primary."""
+    return attribute_writes(db, request.headers.get("authorization"))
+
+
+def get_read_db(request: Request):
+    """Session for read-only endpoints.
+
+    Uses a replica (round-robin) when ``READ_DATABASE_URLS`` is set, except
+    for callers who committed a write within ``READ_YOUR_WRITES_SECONDS``,
+    who keep reading from the primary so they always see their own changes.
+    Recent writers are remembered per process; see the README.
+    """
+    db = read_session(subject_from_authorization(request.headers.get("authorization")))
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def _user_from_token(token: str, db: Session) -> User:
     payload = decode_access_token(token)
     if not payload:
         raise HTTPException(
@@ -59,6 +77,32 @@ def get_current_user(
     return user
 
 
+def get_current_user(
+    token: Annotated[str, Depends(oauth2_scheme)],
+    db: Annotated[Session, Depends(get_db)],
+) -> User:
+    return _user_from_token(token, db)
+
+
+def get_stream_user(access_token: Annotated[str, Query()]) -> User:
+    """Authenticate from a query parameter, for clients such as ``EventSource``
+    that cannot send an ``Authorization`` header.
+
+    Uses its own short-lived session rather than ``get_db``: yield
+    dependencies live until a streaming response ends, and each open stream
+    would otherwise pin a pooled connection.
+    """
+    db = SessionLocal()
+    try:
+        user = _user_from_token(access_token, db)
+        db.expunge(user)
+    finally:
+        db.close()
+    if user.role not in {"admin", "user"}:
+        raise HTTPException(status_code=403, detail="Access denied")
+    return user
+
+
 def require_admin(current_user: Annotated[User, Depends(get_current_user)]) -> User:
     role = (current_user.role or "").strip().lower()
     if role != "admin":
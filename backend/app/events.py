@@ -0,0 +1,156 @@
+"""Circulation change feed backed by a transactional outbox.
+
+Writers call ``record_event`` before committing, so an event exists exactly
+when its change does.  Each branch partition (see ``branches.py``) has its
+own outbox, and events are tagged with the writing session's branch.
+Readers resume from a sequence number (the outbox row id) and receive only
+the events after it, either in bulk via ``events_after`` or as a
+Server-Sent Events stream via ``sse_stream``.
+
+Sequence numbers are allocated when a row is inserted but become visible
+when its transaction commits.  On SQLite writers are serialised, so the two
+orders agree; on server databases a slow transaction can commit an id below
+one a reader has already passed.  The stream therefore only treats ids older
+than ``SSE_SETTLE_SECONDS`` as final and keeps re-reading the ones after
+them.  ``events_after`` on its own has no such guard.
+"""
+import asyncio
+import json
+import os
+from datetime import date, datetime, timedelta
+from typing import AsyncIterator
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from .database import partition_session, partition_url
+from .models import CirculationEvent
+
+EVENT_ISSUED = "issued"
+EVENT_RETURN_PENDING = "return_pending"
+EVENT_RETURNED = "returned"
+EVENT_BOOK_UPDATED = "book_updated"
+EVENT_FINES_RECOMPUTED = "fines_recomputed"
+
+SSE_POLL_SECONDS = 1.0
+SSE_HEARTBEAT_SECONDS = 15.0
+SSE_BATCH_SIZE = 500
+# Longer than any write transaction (plus clock skew between app servers).
+SSE_SETTLE_SECONDS = float(os.getenv("SSE_SETTLE_SECONDS", "5"))
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Unserializable event value: {value!r}")
+
+
+def record_event(
+    db: Session,
+    event_type: str,
+    transaction_id: int | None = None,
+    book_id: int | None = None,
+    **payload,
+) -> None:
+    """Stage an outbox row in the caller's transaction (no commit)."""
+    payload.update(transaction_id=transaction_id, book_id=book_id)
+    db.add(
+        CirculationEvent(
+            event_type=event_type,
+            branch=db.info.get("branch"),
+            transaction_id=transaction_id,
+            book_id=book_id,
+            payload=json.dumps(payload, default=_json_default),
+            created_at=datetime.now(),
+        )
+    )
+
+
+def latest_sequence(db: Session) -> int:
+    return db.query(func.max(CirculationEvent.id)).scalar() or 0
+
+
+def events_after(
+    db: Session,
+    after: int,
+    branch: str | None = None,
+    until: int | None = None,
+    limit: int = SSE_BATCH_SIZE,
+) -> list[CirculationEvent]:
+    query = db.query(CirculationEvent).filter(CirculationEvent.id > after)
+    if until is not None:
+        query = query.filter(CirculationEvent.id <= until)
+    if branch is not None:
+        query = query.filter(or_(CirculationEvent.branch.is_(None), CirculationEvent.branch == branch))
+    return query.order_by(CirculationEvent.id).limit(limit).all()
+
+
+def settled_sequence(db: Session, below: int | None = None, now: datetime | None = None) -> int:
+    """Highest event id (optionally ``<= below``) recorded more than
+    ``SSE_SETTLE_SECONDS`` ago; no id under it can still appear."""
+    cutoff = (now or datetime.now()) - timedelta(seconds=SSE_SETTLE_SECONDS)
+    query = db.query(CirculationEvent.id).filter(CirculationEvent.created_at < cutoff)
+    if below is not None:
+        query = query.filter(CirculationEvent.id <= below)
+    # Newest first by primary key: only the unsettled tail is walked.
+    return query.order_by(CirculationEvent.id.desc()).limit(1).scalar() or 0
+
+
+def _fetch(
+    settled: int,
+    branch: str,
+    sent: frozenset[int],
+) -> tuple[list[tuple[int, str, str]], int]:
+    """Read ``branch``'s events above ``settled`` that were not sent yet.
+
+    Returns the new events (at most ``SSE_BATCH_SIZE``) and the new settled
+    position: the highest id that is both settled and not above any event
+    still to be sent.
+    """
+    db = partition_session(partition_url(branch))
+    try:
+        now = datetime.now()
+        rows = events_after(db, settled, branch, limit=SSE_BATCH_SIZE + len(sent))
+        fresh = [e for e in rows if e.id not in sent][:SSE_BATCH_SIZE]
+        scanned_all = len(rows) < SSE_BATCH_SIZE + len(sent)
+        bound = None if scanned_all or not fresh else fresh[-1].id
+        # Events of other branches sharing the partition are filtered out
+        # above, but still move the settled position.
+        floor = settled_sequence(db, bound, now)
+        return [(e.id, e.event_type, e.payload) for e in fresh], max(settled, floor)
+    finally:
+        db.close()
+
+
+async def sse_stream(after: int, branch: str) -> AsyncIterator[str]:
+    """Yield SSE frames for ``branch``'s events after ``after``, then follow new ones.
+
+    Ids of the last ``SSE_SETTLE_SECONDS`` are re-read on every poll, so a
+    client may see an event it already has after reconnecting; events are
+    never skipped as long as no write transaction stays open longer than that.
+    """
+    db = partition_session(partition_url(branch))
+    try:
+        settled = settled_sequence(db, after)
+    finally:
+        db.close()
+    sent: set[int] = set()
+    idle = 0.0
+    yield f"retry: {int(SSE_POLL_SECONDS * 1000) * 3}\n\n"
+    while True:
+        batch, settled = await run_in_threadpool(_fetch, settled, branch, frozenset(sent))
+        for seq, event_type, payload in batch:
+            sent.add(seq)
+            yield f"id: {seq}\nevent: {event_type}\ndata: {payload}\n\n"
+        sent = {seq for seq in sent if seq > settled}
+        if len(batch) == SSE_BATCH_SIZE:
+            continue
+        if batch:
+            idle = 0.0
+        elif idle >= SSE_HEARTBEAT_SECONDS:
+            # Comment frame keeps proxies from closing an idle connection.
+            yield ": keep-alive\n\n"
+            idle = 0.0
+        await asyncio.sleep(SSE_POLL_SECONDS)
+        idle += SSE_POLL_SECONDS
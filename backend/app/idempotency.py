@@ -0,0 +1,186 @@
+"""``Idempotency-Key`` support for write endpoints.
+
+Routers opt in with ``APIRouter(..., route_class=IdempotentRoute)``.  For
+POST/PUT/PATCH/DELETE requests that carry the header, the first attempt is
+recorded in ``idempotency_keys`` and its response stored; replays with the
+same key return the stored response without running the endpoint, so none
+of the business tables are read or written again.  The caller's branch is
+part of the request: a stored response names rows in one branch's
+database, so reusing its key at another branch is rejected.
+"""
+import hashlib
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Callable
+
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+
+from .auth import subject_from_authorization
+from .database import DEFAULT_BRANCH, SessionLocal
+from .models import IdempotencyRecord
+from .profiling import ProfiledRoute
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 60 * 60)))
+EVICT_INTERVAL_SECONDS = 60
+MAX_KEY_LENGTH = 255
+
+_WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+_last_eviction = 0.0
+
+
+def _caller(request: Request) -> str:
+    subject = subject_from_authorization(request.headers.get("authorization"))
+    return f"user:{subject}" if subject else "anonymous"
+
+
+def _branch(request: Request) -> str:
+    """The branch as ``branches.current_branch`` resolves it, unvalidated."""
+    branch = request.headers.get("x-branch") or request.query_params.get("branch")
+    return (branch or DEFAULT_BRANCH).strip()
+
+
+def _digest(*parts: str | bytes) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8") if isinstance(part, str) else part)
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _evict_expired(db) -> None:
+    global _last_eviction
+    now = time.monotonic()
+    if now - _last_eviction < EVICT_INTERVAL_SECONDS:
+        return
+    _last_eviction = now
+    db.execute(delete(IdempotencyRecord).where(IdempotencyRecord.expires_at < datetime.now()))
+
+
+def _conflict(detail: str, status_code: int) -> Response:
+    return JSONResponse(status_code=status_code, content={"detail": detail})
+
+
+def _begin(key_hash: str, request_hash: str) -> Response | None:
+    """Claim ``key_hash`` for a first attempt, or return the response to replay."""
+    db = SessionLocal()
+    try:
+        record = db.get(IdempotencyRecord, key_hash)
+        if record and record.expires_at < datetime.now():
+            db.delete(record)
+            db.commit()
+            record = None
+
+        if record:
+            if record.request_hash != request_hash:
+                return _conflict("Idempotency-Key reused with a different request", 422)
+            if record.status_code is None:
+                return _conflict("A request with this Idempotency-Key is in progress", 409)
+            return Response(
+                content=record.response_body or "",
+                status_code=record.status_code,
+                media_type="application/json",
+                headers={"Idempotent-Replayed": "true"},
+            )
+
+        _evict_expired(db)
+        db.add(
+            IdempotencyRecord(
+                key_hash=key_hash,
+                request_hash=request_hash,
+                expires_at=datetime.now() + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+            )
+        )
+        try:
+            db.commit()
+        except IntegrityError:
+            # Lost the race against a concurrent retry with the same key.
+            db.rollback()
+            return _conflict("A request with this Idempotency-Key is in progress", 409)
+        return None
+    finally:
+        db.close()
+
+
+def _finish(key_hash: str, status_code: int, body: bytes) -> None:
+    db = SessionLocal()
+    try:
+        record = db.get(IdempotencyRecord, key_hash)
+        if record:
+            record.status_code = status_code
+            record.response_body = body.decode("utf-8")
+            db.commit()
+    finally:
+        db.close()
+
+
+def _forget(key_hash: str) -> None:
+    db = SessionLocal()
+    try:
+        db.execute(delete(IdempotencyRecord).where(IdempotencyRecord.key_hash == key_hash))
+        db.commit()
+    finally:
+        db.close()
+
+
+class IdempotentRoute(ProfiledRoute):
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def idempotent_handler(request: Request) -> Response:
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not key or request.method not in _WRITE_METHODS:
+                return await handler(request)
+            if len(key) > MAX_KEY_LENGTH:
+                return _conflict("Idempotency-Key too long", 400)
+
+            key_hash = _digest(_caller(request), request.method, request.url.path, key)
+            request_hash = _digest(_branch(request), await request.body())
+
+            replay = await run_in_threadpool(_begin, key_hash, request_hash)
+            if replay is not None:
+                return replay
+
+            failed = False
+
+            async def forget_if_failed() -> None:
+                if failed:
+                    await run_in_threadpool(_forget, key_hash)
+
+            # A crashed endpoint's sessions stay open (on SQLite, holding the
+            # write lock) until FastAPI tears its dependencies down, so the key
+            # is forgotten from the request's exit stack, which unwinds after them.
+            request_stack = request.scope.get("fastapi_inner_astack")
+            if request_stack is not None:
+                request_stack.push_async_callback(forget_if_failed)
+
+            try:
+                response = await handler(request)
+            except HTTPException as exc:
+                # Business-rule rejections are final outcomes too; store them.
+                response = JSONResponse(
+                    status_code=exc.status_code,
+                    content={"detail": exc.detail},
+                    headers=exc.headers,
+                )
+            except Exception:
+                failed = True
+                if request_stack is None:
+                    await run_in_threadpool(_forget, key_hash)
+                raise
+
+            if response.status_code >= 500:
+                # Server errors are not final; let the client retry for real.
+                failed = True
+                if request_stack is None:
+                    await run_in_threadpool(_forget, key_hash)
+            else:
+                await run_in_threadpool(_finish, key_hash, response.status_code, bytes(response.body))
+            return response
+
+        return idempotent_handler
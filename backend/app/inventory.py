@@ -0,0 +1,128 @@
+"""Copy-level inventory helpers.
+
+Every physical copy is a ``Book`` row that references a ``Title``; titles
+are per branch, so a title's copies are always on that branch's shelves.  The
+title keeps ``total_copies`` / ``available_copies`` counters so that
+availability checks never have to scan copy rows; the helpers below are the
+only places that move those counters and always do so with atomic UPDATEs.
+"""
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .models import Book, Title
+
+# A concurrent issue can grab the copy we picked between the SELECT and the
+# conditional UPDATE; retry a handful of times before giving up.
+_CLAIM_ATTEMPTS = 5
+
+
+def get_or_create_title(
+    db: Session,
+    title: str,
+    author: str,
+    media_type: str,
+    category: str,
+    branch: str,
+) -> Title:
+    record = _find_title(db, title, author, media_type, branch)
+    if record:
+        return record
+
+    record = Title(
+        branch=branch,
+        title=title,
+        author=author,
+        media_type=media_type,
+        category=category,
+        total_copies=0,
+        available_copies=0,
+    )
+    try:
+        with db.begin_nested():
+            db.add(record)
+    except IntegrityError:
+        # Another request created the same title since our SELECT; the
+        # unique constraint kept theirs.
+        return _find_title(db, title, author, media_type, branch)
+    return record
+
+
+def _find_title(db: Session, title: str, author: str, media_type: str, branch: str) -> Title | None:
+    return (
+        db.query(Title)
+        .filter(
+            Title.branch == branch,
+            Title.title == title,
+            Title.author == author,
+            Title.media_type == media_type,
+        )
+        .first()
+    )
+
+
+def adjust_counts(db: Session, title_id: int, total: int = 0, available: int = 0) -> None:
+    if not total and not available:
+        return
+    db.execute(
+        update(Title)
+        .where(Title.id == title_id)
+        .values(
+            total_copies=Title.total_copies + total,
+            available_copies=Title.available_copies + available,
+        )
+    )
+
+
+def claim_copy(db: Session, title_id: int, branch: str) -> Book | None:
+    """Reserve one free copy of ``title_id`` at ``branch`` and mark it unavailable.
+
+    The title counter is decremented with a single conditional UPDATE, which
+    is what serialises concurrent issues.  Returns ``None`` if no copy is free.
+    """
+    reserved = db.execute(
+        update(Title)
+        .where(Title.id == title_id, Title.branch == branch, Title.available_copies > 0)
+        .values(available_copies=Title.available_copies - 1)
+    )
+    if reserved.rowcount != 1:
+        return None
+
+    for _ in range(_CLAIM_ATTEMPTS):
+        copy_id = (
+            db.query(Book.id)
+            .filter(Book.title_id == title_id, Book.available == True)
+            .limit(1)
+            .scalar()
+        )
+        if copy_id is None:
+            break
+        if _mark_copy(db, copy_id, available=False):
+            return db.get(Book, copy_id)
+
+    # Counter and copy rows disagree; give the slot back.
+    adjust_counts(db, title_id, available=1)
+    return None
+
+
+def claim_specific_copy(db: Session, book: Book) -> bool:
+    if not _mark_copy(db, book.id, available=False):
+        return False
+    adjust_counts(db, book.title_id, available=-1)
+    db.refresh(book)
+    return True
+
+
+def release_copy(db: Session, book: Book) -> None:
+    if _mark_copy(db, book.id, available=True):
+        adjust_counts(db, book.title_id, available=1)
+        db.refresh(book)
+
+
+def _mark_copy(db: Session, book_id: int, available: bool) -> bool:
+    result = db.execute(
+        update(Book)
+        .where(Book.id == book_id, Book.available == (not available))
+        .values(available=available)
+    )
+    return result.rowcount == 1
@@ -1,22 +1,76 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager, suppress
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 
 from .auth import hash_password
-from .database import Base, SessionLocal, engine
+from .branches import create_partitions, shutdown_fan_out
+from .database import SessionLocal
+from .memberships import run_expiry_sweeps
 from .models import User
-from .routes import admin, login, maintenance, reports, transactions, user
+from .onboarding import shutdown_hash_pool, start_hash_pool
+from .profiling import PROFILE_ID_HEADER, ProfilingMiddleware
+from .ratelimit import AdmissionControlMiddleware
+from .report_jobs import fail_interrupted_jobs, run_lease_renewals, shutdown_report_jobs
+from .reservations import run_pickup_sweeps
+from .routes import admin, holds, login, maintenance, reports, transactions, user
+from .static_assets import frontend_assets
+from .static_assets import router as frontend_router
+
+# Responses smaller than this are sent as-is; compression costs more than it saves.
+API_COMPRESSION_MIN_BYTES = int(os.getenv("API_COMPRESSION_MIN_BYTES", "1024"))
+API_COMPRESSION_LEVEL = int(os.getenv("API_COMPRESSION_LEVEL", "6"))  # 1 (fastest) .. 9 (smallest)
+
 
-app = FastAPI(title="Library Management System", version="1.0.0")
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    fail_interrupted_jobs()
+    frontend_assets()  # fingerprint and precompress before the first request
+    start_hash_pool()
+    sweepers = [
+        asyncio.create_task(run_expiry_sweeps()),
+        asyncio.create_task(run_pickup_sweeps()),
+        asyncio.create_task(run_lease_renewals()),
+    ]
+    try:
+        yield
+    finally:
+        for sweeper in sweepers:
+            sweeper.cancel()
+            with suppress(asyncio.CancelledError):
+                await sweeper
+        shutdown_report_jobs()
+        shutdown_fan_out()
+        shutdown_hash_pool()
 
+
+app = FastAPI(title="Library Management System", version="1.0.0", lifespan=lifespan)
+
+# Innermost, so it only sees handler output; precompressed frontend files
+# already carry Content-Encoding and SSE streams are left alone.
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=API_COMPRESSION_MIN_BYTES,
+    compresslevel=API_COMPRESSION_LEVEL,
+)
+# Added before CORS so that 429 responses still carry CORS headers.
+app.add_middleware(AdmissionControlMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Event-Seq", PROFILE_ID_HEADER],
 )
+# Outermost: a profile times the whole stack, and plans are gathered after
+# the response without holding an admission slot.
+app.add_middleware(ProfilingMiddleware)
 
-Base.metadata.create_all(bind=engine)
+create_partitions()
 
 
 def seed_defaults():
@@ -55,7 +109,9 @@ app.include_router(admin.router)
 app.include_router(user.router)
 app.include_router(maintenance.router)
 app.include_router(transactions.router)
+app.include_router(holds.router)
 app.include_router(reports.router)
+app.include_router(frontend_router)
 
 
 @app.get("/")
@@ -0,0 +1,142 @@
+"""Membership validity cache and the daily expiry sweep.
+
+Issuing a book only needs a membership's ``active`` flag and date window,
+which change rarely, so they are cached in-process by ``membership_id``.
+The cache stores the window rather than a yes/no answer, so an entry stays
+correct as days pass; writers that change a membership must call
+``invalidate_membership`` (or ``clear_membership_cache``) after committing.
+Every invalidation bumps a generation counter, and a lookup only fills the
+cache if no invalidation happened while it was reading the database, so a
+slow reader can never put back a window that a writer just replaced.
+
+The cache is per process and invalidation only reaches the process that
+made the change.  Entries therefore also expire after
+``MEMBERSHIP_CACHE_TTL_SECONDS``, which bounds how long another worker can
+keep honouring a cancelled membership.
+
+The sweep only clears ``active``; a cancelled membership also has
+``cancelled`` set, which is what stops it from being renewed.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import NamedTuple
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from .database import SessionLocal
+from .models import Membership
+
+MEMBERSHIP_CACHE_SIZE = 10_000
+MEMBERSHIP_CACHE_TTL_SECONDS = float(os.getenv("MEMBERSHIP_CACHE_TTL_SECONDS", "30"))
+MEMBERSHIP_SWEEP_INTERVAL_SECONDS = int(os.getenv("MEMBERSHIP_SWEEP_INTERVAL_SECONDS", str(24 * 60 * 60)))
+
+logger = logging.getLogger(__name__)
+
+
+class MembershipWindow(NamedTuple):
+    active: bool
+    start_date: date
+    end_date: date
+
+    def valid_on(self, on_date: date) -> bool:
+        return self.active and self.start_date <= on_date <= self.end_date
+
+
+# membership_id -> (window, time.monotonic() after which it is re-read)
+_cache: "OrderedDict[int, tuple[MembershipWindow | None, float]]" = OrderedDict()
+_lock = threading.Lock()
+_generation = 0  # bumped by every invalidation
+
+
+def membership_window(db: Session, membership_id: int) -> MembershipWindow | None:
+    with _lock:
+        cached = _cache.get(membership_id)
+        if cached is not None and time.monotonic() < cached[1]:
+            _cache.move_to_end(membership_id)
+            return cached[0]
+        generation = _generation
+
+    row = (
+        db.query(Membership.active, Membership.start_date, Membership.end_date)
+        .filter(Membership.id == membership_id)
+        .first()
+    )
+    window = MembershipWindow(bool(row.active), row.start_date, row.end_date) if row else None
+
+    with _lock:
+        if generation != _generation:
+            return window  # invalidated while we read; don't cache what may be stale
+        _cache[membership_id] = (window, time.monotonic() + MEMBERSHIP_CACHE_TTL_SECONDS)
+        _cache.move_to_end(membership_id)
+        while len(_cache) > MEMBERSHIP_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return window
+
+
+def membership_valid(db: Session, membership_id: int | None, on_date: date) -> bool:
+    if not membership_id:
+        return False
+    window = membership_window(db, membership_id)
+    return window is not None and window.valid_on(on_date)
+
+
+def invalidate_membership(*membership_ids: int | None) -> None:
+    global _generation
+    with _lock:
+        _generation += 1
+        for membership_id in membership_ids:
+            if membership_id is not None:
+                _cache.pop(membership_id, None)
+
+
+def clear_membership_cache() -> None:
+    global _generation
+    with _lock:
+        _generation += 1
+        _cache.clear()
+
+
+def expire_lapsed_memberships(db: Session, today: date | None = None) -> int:
+    """Mark every active membership whose end date has passed as inactive.
+
+    One set-based UPDATE driven by the ``(active, end_date)`` index; returns
+    the number of memberships expired.
+    """
+    today = today or date.today()
+    result = db.execute(
+        update(Membership)
+        .where(Membership.active == True, Membership.end_date < today)
+        .values(active=False)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    if result.rowcount:
+        clear_membership_cache()
+    return result.rowcount
+
+
+def _sweep_once() -> int:
+    db = SessionLocal()
+    try:
+        return expire_lapsed_memberships(db)
+    finally:
+        db.close()
+
+
+async def run_expiry_sweeps(interval_seconds: int = MEMBERSHIP_SWEEP_INTERVAL_SECONDS) -> None:
+    """Run the expiry sweep now and then every ``interval_seconds`` until cancelled."""
+    while True:
+        try:
+            expired = await run_in_threadpool(_sweep_once)
+            if expired:
+                logger.info("Expired %d lapsed memberships", expired)
+        except Exception:
+            logger.exception("Membership expiry sweep failed")
+        await asyncio.sleep(interval_seconds)
@@ -0,0 +1,266 @@
+"""Upgrade a database created by an earlier release to the current schema.
+
+``Base.metadata.create_all`` only creates missing tables; it never changes
+existing ones.  Each step below inspects the live schema, does nothing if
+it is already applied, and otherwise rewrites the affected tables in place,
+so the command is safe to re-run.  Stop the API first and take a backup.
+
+CLI usage (from ``backend/``)::
+
+    python -m app.migrations              # primary and every branch partition
+    python -m app.migrations --dry-run    # list pending steps only
+"""
+import argparse
+from datetime import date
+
+from sqlalchemy import MetaData, inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateTable
+
+from .database import DEFAULT_BRANCH, Base, partition_engines
+from . import models  # noqa: F401  (registers the tables on Base.metadata)
+from .branches import partition_tables
+
+
+def _columns(conn: Connection, table: str) -> set[str]:
+    inspector = inspect(conn)
+    if not inspector.has_table(table):
+        return set()
+    return {column["name"] for column in inspector.get_columns(table)}
+
+
+# --------------------------------------------------
+# Steps
+# --------------------------------------------------
+# Tables that gained a ``branch`` column when data was partitioned by branch.
+BRANCH_TABLES = ("titles", "books", "memberships", "transactions", "circulation_events")
+
+
+def _branch_columns_pending(conn: Connection) -> bool:
+    return any(_columns(conn, table) and "branch" not in _columns(conn, table) for table in BRANCH_TABLES)
+
+
+def _branch_columns(conn: Connection) -> None:
+    """Existing rows belong to the default branch.  Events stay NULL, which
+    every branch's feed shows."""
+    for table in BRANCH_TABLES:
+        columns = _columns(conn, table)
+        if not columns or "branch" in columns:
+            continue
+        if table == "circulation_events":
+            conn.execute(text("ALTER TABLE circulation_events ADD COLUMN branch VARCHAR(30)"))
+        else:
+            conn.execute(
+                text(f"ALTER TABLE {table} ADD COLUMN branch VARCHAR(30) NOT NULL DEFAULT '{DEFAULT_BRANCH}'")
+            )
+
+
+def _title_unique_pending(conn: Connection) -> bool:
+    if not _columns(conn, "titles"):
+        return False
+    names = {c["name"] for c in inspect(conn).get_unique_constraints("titles")}
+    return "uq_titles_branch_title_author_media" not in names
+
+
+def _title_unique(conn: Connection) -> None:
+    """Titles are unique per branch, so the same book can be catalogued at
+    several branches.  SQLite cannot alter constraints, so the table is
+    rebuilt from the current model there."""
+    if conn.dialect.name != "sqlite":
+        drop = "DROP INDEX" if conn.dialect.name == "mysql" else "DROP CONSTRAINT"
+        conn.execute(text(f"ALTER TABLE titles {drop} uq_titles_title_author_media"))
+        conn.execute(text(
+            "ALTER TABLE titles ADD CONSTRAINT uq_titles_branch_title_author_media "
+            "UNIQUE (branch, title, author, media_type)"
+        ))
+        return
+
+    _rebuild_sqlite_table(conn, models.Title.__table__)
+
+
+def _rebuild_sqlite_table(conn: Connection, table) -> None:
+    """Recreate ``table`` from the current model, keeping its rows.
+
+    The new table is built beside the old one and renamed into place, so
+    foreign keys elsewhere keep naming it.  Every model column must already
+    exist in the old table.
+    """
+    columns = ", ".join(column.name for column in table.columns)
+    scratch = MetaData()
+    for other in Base.metadata.sorted_tables:
+        other.to_metadata(scratch)  # so the copy's foreign keys resolve
+    conn.execute(CreateTable(table.to_metadata(scratch, name=f"{table.name}_new")))
+    conn.execute(text(f"INSERT INTO {table.name}_new ({columns}) SELECT {columns} FROM {table.name}"))
+    conn.execute(text(f"DROP TABLE {table.name}"))
+    conn.execute(text(f"ALTER TABLE {table.name}_new RENAME TO {table.name}"))
+    for index in table.indexes:
+        index.create(conn)
+
+
+def _split_titles_pending(conn: Connection) -> bool:
+    return "title" in _columns(conn, "books")
+
+
+def _split_titles(conn: Connection) -> None:
+    """Baseline ``books`` rows carried their own bibliographic fields; move
+    them to one ``titles`` row per (title, author, media type) and seed the
+    copy counters from the copies' availability."""
+    conn.execute(text("ALTER TABLE books ADD COLUMN title_id INTEGER"))
+    conn.execute(
+        text(
+            "INSERT INTO titles (branch, title, author, media_type, category, total_copies, available_copies) "
+            "SELECT :branch, title, author, COALESCE(media_type, 'book'), MIN(COALESCE(category, 'general')), "
+            "COUNT(*), SUM(CASE WHEN available THEN 1 ELSE 0 END) "
+            "FROM books GROUP BY title, author, COALESCE(media_type, 'book')"
+        ),
+        {"branch": DEFAULT_BRANCH},
+    )
+    conn.execute(
+        text(
+            "UPDATE books SET title_id = ("
+            "SELECT titles.id FROM titles WHERE titles.branch = :branch AND titles.title = books.title "
+            "AND titles.author = books.author AND titles.media_type = COALESCE(books.media_type, 'book'))"
+        ),
+        {"branch": DEFAULT_BRANCH},
+    )
+    # SQLite >= 3.35 and MySQL both support DROP COLUMN; none of these is indexed.
+    for column in ("title", "author", "media_type", "category"):
+        conn.execute(text(f"ALTER TABLE books DROP COLUMN {column}"))
+    conn.execute(text("CREATE INDEX ix_books_title_available ON books (title_id, available)"))
+
+
+def _membership_cancelled_pending(conn: Connection) -> bool:
+    columns = _columns(conn, "memberships")
+    return bool(columns) and "cancelled" not in columns
+
+
+def _membership_cancelled(conn: Connection) -> None:
+    """Tell cancellations apart from lapses.  Before this column both just
+    cleared ``active``; an inactive membership that has not yet reached its
+    end date can only have been cancelled, the rest are treated as lapsed."""
+    conn.execute(text("ALTER TABLE memberships ADD COLUMN cancelled BOOLEAN NOT NULL DEFAULT 0"))
+    conn.execute(
+        text("UPDATE memberships SET cancelled = 1 WHERE active = 0 AND end_date >= :today"),
+        {"today": date.today()},
+    )
+
+
+def _report_job_leases_pending(conn: Connection) -> bool:
+    columns = _columns(conn, "report_jobs")
+    return bool(columns) and "worker_id" not in columns
+
+
+def _report_job_leases(conn: Connection) -> None:
+    """Jobs now record their owning process and its last lease renewal.
+    Unfinished jobs from before have neither and are failed at startup."""
+    conn.execute(text("ALTER TABLE report_jobs ADD COLUMN worker_id VARCHAR(32)"))
+    conn.execute(text("ALTER TABLE report_jobs ADD COLUMN heartbeat_at DATETIME"))
+
+
+def _in_flight_key_pending(conn: Connection) -> bool:
+    columns = _columns(conn, "report_jobs")
+    return bool(columns) and "in_flight_key" not in columns
+
+
+def _in_flight_key(conn: Connection) -> None:
+    """Job de-duplication moves into the database; its unique index is built
+    by the index step.  Unfinished jobs keep NULL and are failed at startup."""
+    conn.execute(text("ALTER TABLE report_jobs ADD COLUMN in_flight_key VARCHAR(64)"))
+
+
+# Branch tables that referenced users before they could live in a branch database.
+USER_REFERENCING_TABLES = ("transactions", "holds")
+
+
+def _user_foreign_keys(conn: Connection) -> list[tuple[str, str | None]]:
+    inspector = inspect(conn)
+    return [
+        (table, fk["name"])
+        for table in USER_REFERENCING_TABLES
+        if inspector.has_table(table)
+        for fk in inspector.get_foreign_keys(table)
+        if fk["referred_table"] == "users"
+    ]
+
+
+def _drop_user_foreign_keys(conn: Connection) -> None:
+    """A branch database has no users, so these keys would reject every
+    issue and hold once foreign keys are enforced."""
+    for table, name in _user_foreign_keys(conn):
+        if conn.dialect.name == "sqlite":
+            _rebuild_sqlite_table(conn, Base.metadata.tables[table])
+        else:
+            drop = "DROP FOREIGN KEY" if conn.dialect.name == "mysql" else "DROP CONSTRAINT"
+            conn.execute(text(f"ALTER TABLE {table} {drop} {name}"))
+
+
+def _missing_indexes(conn: Connection) -> list:
+    inspector = inspect(conn)
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        missing.extend(index for index in table.indexes if index.name not in existing)
+    return missing
+
+
+def _create_indexes(conn: Connection) -> None:
+    """Indexes added to existing tables, e.g. for the sweeps and desk lists."""
+    for index in _missing_indexes(conn):
+        index.create(conn)
+
+
+# (name, pending?, apply) in the order they must run: the branch columns come
+# first because the titles split writes them, and indexes come last because
+# they may cover columns the other steps add.
+STEPS = [
+    ("add branch columns", _branch_columns_pending, _branch_columns),
+    ("make titles unique per branch", _title_unique_pending, _title_unique),
+    ("split books into titles and copies", _split_titles_pending, _split_titles),
+    ("record membership cancellations", _membership_cancelled_pending, _membership_cancelled),
+    ("add report job leases", _report_job_leases_pending, _report_job_leases),
+    ("de-duplicate report jobs in the database", _in_flight_key_pending, _in_flight_key),
+    ("drop foreign keys to users from branch tables", lambda conn: bool(_user_foreign_keys(conn)), _drop_user_foreign_keys),
+    ("create missing indexes", lambda conn: bool(_missing_indexes(conn)), _create_indexes),
+]
+
+
+def pending_steps(conn: Connection) -> list[str]:
+    return [name for name, pending, _ in STEPS if pending(conn)]
+
+
+def upgrade(engine: Engine, tables: list | None = None) -> list[str]:
+    """Bring ``engine``'s database up to date; returns the steps applied.
+
+    ``tables`` limits the tables created, as for a branch database.
+    """
+    applied = []
+    with engine.begin() as conn:
+        # New tables first, so steps can fill them.
+        Base.metadata.create_all(bind=conn, tables=tables)
+        for name, pending, apply in STEPS:
+            if pending(conn):
+                apply(conn)
+                applied.append(name)
+    return applied
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Upgrade existing databases to the current schema.")
+    parser.add_argument("--dry-run", action="store_true", help="list pending steps without applying them")
+    args = parser.parse_args()
+
+    for url, partition_engine in partition_engines.items():
+        label = partition_engine.url.render_as_string(hide_password=True)
+        if args.dry_run:
+            with partition_engine.connect() as conn:
+                steps = pending_steps(conn)
+        else:
+            steps = upgrade(partition_engine, partition_tables(url))
+        verb = "pending" if args.dry_run else "applied"
+        print(f"{label}: {verb} {', '.join(steps) if steps else 'nothing'}")
+
+
+if __name__ == "__main__":
+    main()
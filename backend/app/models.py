@@ -4,11 +4,14 @@ from sqlalchemy import (
     String,
     Boolean,
     Date,
+    DateTime,
     ForeignKey,
-    Text
+    Index,
+    Text,
+    UniqueConstraint,
 )
 from sqlalchemy.orm import relationship
-from .database import Base
+from .database import DEFAULT_BRANCH, Base
 
 
 # --------------------------------------------------
@@ -24,24 +27,48 @@ class User(Base):
     role = Column(String(20), default="user")  # admin / user
     membership_id = Column(Integer, ForeignKey("memberships.id"), nullable=True)
 
-    transactions = relationship("Transaction", back_populates="user")
+    # No FK: transactions may live in a branch database (see PARTITIONED_TABLES).
+    transactions = relationship(
+        "Transaction", primaryjoin="User.id == foreign(Transaction.user_id)", back_populates="user"
+    )
     membership = relationship("Membership", back_populates="users")
 
 
 # --------------------------------------------------
-# BOOK / MOVIE MODEL
+# TITLE MODEL (bibliographic record shared by copies)
+# --------------------------------------------------
+class Title(Base):
+    __tablename__ = "titles"
+    __table_args__ = (
+        UniqueConstraint("branch", "title", "author", "media_type", name="uq_titles_branch_title_author_media"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    branch = Column(String(30), nullable=False, default=DEFAULT_BRANCH)
+    title = Column(String(100), nullable=False, index=True)
+    author = Column(String(100), nullable=False)
+    media_type = Column(String(20), default="book", index=True)  # book / movie
+    category = Column(String(50), default="general")
+    total_copies = Column(Integer, nullable=False, default=0)
+    available_copies = Column(Integer, nullable=False, default=0)
+
+    copies = relationship("Book", back_populates="title_record")
+
+
+# --------------------------------------------------
+# BOOK / MOVIE COPY MODEL
 # --------------------------------------------------
 class Book(Base):
     __tablename__ = "books"
+    __table_args__ = (Index("ix_books_title_available", "title_id", "available"),)
 
     id = Column(Integer, primary_key=True, index=True)
-    title = Column(String(100), nullable=False)
-    author = Column(String(100), nullable=False)
+    branch = Column(String(30), nullable=False, default=DEFAULT_BRANCH, index=True)
+    title_id = Column(Integer, ForeignKey("titles.id"), nullable=False)
     serial_no = Column(String(50), unique=True, nullable=False)
-    media_type = Column(String(20), default="book")  # book / movie
-    category = Column(String(50), default="general")
     available = Column(Boolean, default=True)
 
+    title_record = relationship("Title", back_populates="copies")
     transactions = relationship("Transaction", back_populates="book")
 
 
@@ -50,14 +77,18 @@ class Book(Base):
 # --------------------------------------------------
 class Membership(Base):
     __tablename__ = "memberships"
+    # Expiry sweep: WHERE active = 1 AND end_date < today
+    __table_args__ = (Index("ix_memberships_active_end_date", "active", "end_date"),)
 
     id = Column(Integer, primary_key=True, index=True)
     membership_number = Column(String(30), unique=True, nullable=False)
+    branch = Column(String(30), nullable=False, default=DEFAULT_BRANCH, index=True)  # home branch
     name = Column(String(100), nullable=False)
     membership_type = Column(String(20), nullable=False)
     start_date = Column(Date, nullable=False)
     end_date = Column(Date, nullable=False)
-    active = Column(Boolean, default=True)
+    active = Column(Boolean, default=True)  # false once lapsed or cancelled
+    cancelled = Column(Boolean, nullable=False, default=False)  # lapsed memberships can be renewed, cancelled ones cannot
     users = relationship("User", back_populates="membership")
 
 
@@ -66,10 +97,13 @@ class Membership(Base):
 # --------------------------------------------------
 class Transaction(Base):
     __tablename__ = "transactions"
+    # Desk lists: WHERE branch = ? AND return_date IS NULL [AND due_date < today]
+    __table_args__ = (Index("ix_transactions_branch_open_due", "branch", "return_date", "due_date"),)
 
     id = Column(Integer, primary_key=True, index=True)
+    branch = Column(String(30), nullable=False, default=DEFAULT_BRANCH)
 
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, nullable=False)  # users.id on the primary
     book_id = Column(Integer, ForeignKey("books.id"), nullable=False)
 
     issue_date = Column(Date, nullable=False)
@@ -82,5 +116,110 @@ class Transaction(Base):
 
     remarks = Column(Text, nullable=True)
 
-    user = relationship("User", back_populates="transactions")
+    user = relationship("User", primaryjoin="foreign(Transaction.user_id) == User.id", back_populates="transactions")
     book = relationship("Book", back_populates="transactions")
+
+
+# --------------------------------------------------
+# HOLD / RESERVATION MODEL
+# --------------------------------------------------
+class Hold(Base):
+    __tablename__ = "holds"
+    __table_args__ = (
+        # Head-of-queue lookup: WHERE title_id = ? AND status = 'waiting' ORDER BY id
+        Index("ix_holds_title_status_id", "title_id", "status", "id"),
+        Index("ix_holds_user_status", "user_id", "status"),
+        # Pickup sweep: WHERE status = 'ready' AND ready_at < cutoff
+        Index("ix_holds_status_ready_at", "status", "ready_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    title_id = Column(Integer, ForeignKey("titles.id"), nullable=False)
+    user_id = Column(Integer, nullable=False)  # users.id on the primary
+    book_id = Column(Integer, ForeignKey("books.id"), nullable=True)
+    status = Column(String(20), nullable=False, default="waiting")  # waiting / ready / fulfilled / cancelled / expired
+    placed_at = Column(DateTime, nullable=False)
+    ready_at = Column(DateTime, nullable=True)
+
+    title_record = relationship("Title")
+    user = relationship("User", primaryjoin="foreign(Hold.user_id) == User.id")
+    book = relationship("Book")
+
+
+# --------------------------------------------------
+# IDEMPOTENCY KEY MODEL
+# --------------------------------------------------
+class IdempotencyRecord(Base):
+    __tablename__ = "idempotency_keys"
+
+    key_hash = Column(String(64), primary_key=True)  # sha256 of user + route + key
+    request_hash = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=True)  # NULL while the first attempt is in flight
+    response_body = Column(Text, nullable=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+# --------------------------------------------------
+# CIRCULATION EVENT MODEL (transactional outbox)
+# --------------------------------------------------
+class CirculationEvent(Base):
+    __tablename__ = "circulation_events"
+
+    id = Column(Integer, primary_key=True, index=True)  # doubles as the feed sequence number
+    event_type = Column(String(30), nullable=False)  # issued / return_pending / returned / book_updated / fines_recomputed
+    branch = Column(String(30), nullable=True)  # NULL for events every branch should see
+    transaction_id = Column(Integer, nullable=True)
+    book_id = Column(Integer, nullable=True)
+    payload = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
+
+# --------------------------------------------------
+# REPORT JOB MODEL
+# --------------------------------------------------
+class ReportJob(Base):
+    __tablename__ = "report_jobs"
+    __table_args__ = (
+        Index("ix_report_jobs_dedup_status", "dedup_key", "status"),
+        # At most one queued/running job per request, across all workers.
+        Index("ux_report_jobs_in_flight_key", "in_flight_key", unique=True),
+    )
+
+    id = Column(String(32), primary_key=True)  # uuid4 hex
+    report_type = Column(String(50), nullable=False)
+    params = Column(Text, nullable=False)  # canonical JSON
+    dedup_key = Column(String(64), nullable=False)  # sha256 of report_type + params
+    in_flight_key = Column(String(64), nullable=True)  # dedup_key while queued/running, else NULL
+    status = Column(String(20), nullable=False, default="queued")  # queued / running / done / failed / expired
+    data_version = Column(Integer, nullable=True)  # circulation event sequence the result reflects
+    result_path = Column(String(255), nullable=True)
+    row_count = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+    requested_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    worker_id = Column(String(32), nullable=True)  # process that owns the job
+    heartbeat_at = Column(DateTime, nullable=True)  # owner's last lease renewal
+
+
+# --------------------------------------------------
+# SEQUENCE MODEL (collision-free number allocation)
+# --------------------------------------------------
+class Sequence(Base):
+    __tablename__ = "sequences"
+
+    name = Column(String(50), primary_key=True)
+    next_value = Column(Integer, nullable=False, default=1)
+
+
+# Tables each branch database holds.  Everything else (users, memberships,
+# sequences, idempotency keys, report jobs) lives on the primary only, so
+# these tables carry no foreign keys to it.
+PARTITIONED_TABLES = [
+    Title.__table__,
+    Book.__table__,
+    Transaction.__table__,
+    Hold.__table__,
+    CirculationEvent.__table__,
+]
@@ -0,0 +1,414 @@
+"""On-demand request profiling for admins.
+
+An admin arms profiling for some route templates (``/reports/user-transactions/{user_id}``)
+and/or a percentage of all requests, for a limited time.  Each selected
+request gets:
+
+* a sampling profile of the thread running its endpoint, as folded stacks
+  (``frame;frame;frame count``) that ``flamegraph.pl`` and speedscope read
+  directly;
+* the SQL statements it ran, on any engine, with their timing and, for
+  reads, the ``EXPLAIN QUERY PLAN`` (SQLite) or ``EXPLAIN`` output.  Only
+  the first ``PROFILE_MAX_QUERIES`` are kept, so a long-lived stream cannot
+  grow a profile without bound.
+
+Bound parameters can hold password hashes and personal data, so they are
+only used to run ``EXPLAIN`` while the request finishes; stored profiles
+show each parameter's type, never its value.
+
+Profiles are kept in memory (the last ``PROFILE_KEEP``) and the response
+carries an ``X-Profile-Id`` header to fetch them by.  While profiling is
+disarmed the middleware is a single attribute check and no SQL hooks are
+installed.  Settings and profiles are per process, like the rate limiter:
+arm and read them against a single worker (or a worker you can pin
+requests to), since another worker neither profiles nor knows the id.
+"""
+import functools
+import inspect
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import compile_path
+
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+MAX_EXPLAINS_PER_PROFILE = 50
+PROFILE_MAX_QUERIES = int(os.getenv("PROFILE_MAX_QUERIES", "1000"))
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+_EXPLAINABLE = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+
+_current: ContextVar["RequestProfile | None"] = ContextVar("request_profile", default=None)
+
+
+@dataclass
+class QueryRecord:
+    statement: str
+    parameters: str
+    duration_ms: float
+    rowcount: int
+    database: str
+    engine: Engine = field(repr=False)
+    raw_parameters: object = field(repr=False, default=None)
+    executemany: bool = False
+    plan: list[str] | None = None
+
+
+@dataclass
+class RequestProfile:
+    id: str
+    method: str
+    path: str
+    started_at: datetime
+    duration_ms: float = 0.0
+    status_code: int | None = None
+    samples: Counter = field(default_factory=Counter)
+    queries: list[QueryRecord] = field(default_factory=list)
+    dropped_queries: int = 0  # statements past PROFILE_MAX_QUERIES
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def summary(self) -> dict:
+        return {
+            "profile_id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 2),
+            "status_code": self.status_code,
+            "samples": sum(self.samples.values()),
+            "queries": len(self.queries),
+            "dropped_queries": self.dropped_queries,
+            "sql_ms": round(sum(q.duration_ms for q in self.queries), 2),
+        }
+
+    def detail(self) -> dict:
+        return {
+            **self.summary(),
+            "sample_interval_ms": PROFILE_SAMPLE_INTERVAL_MS,
+            "queries": [
+                {
+                    "statement": q.statement,
+                    "parameters": q.parameters,
+                    "duration_ms": round(q.duration_ms, 3),
+                    "rowcount": q.rowcount,
+                    "database": q.database,
+                    "plan": q.plan,
+                }
+                for q in self.queries
+            ],
+        }
+
+
+@dataclass
+class ProfilingSettings:
+    routes: list[str] = field(default_factory=list)
+    sample_percent: float = 0.0
+    explain: bool = True
+    expires_at: float = 0.0  # time.monotonic()
+    _patterns: list[re.Pattern] = field(default_factory=list, repr=False)
+
+    def selects(self, path: str) -> bool:
+        if any(pattern.match(path) for pattern in self._patterns):
+            return True
+        return self.sample_percent > 0 and random.random() * 100 < self.sample_percent
+
+
+_settings: ProfilingSettings | None = None
+_profiles: deque[RequestProfile] = deque(maxlen=PROFILE_KEEP)
+_lock = threading.Lock()
+
+
+# --------------------------------------------------
+# Arming / disarming
+# --------------------------------------------------
+def enable_profiling(routes: list[str], sample_percent: float, duration_seconds: int, explain: bool = True) -> dict:
+    global _settings
+    _settings = ProfilingSettings(
+        routes=list(routes),
+        sample_percent=sample_percent,
+        explain=explain,
+        expires_at=time.monotonic() + duration_seconds,
+        _patterns=[compile_path(route)[0] for route in routes],
+    )
+    _install_sql_hooks()
+    return profiling_status()
+
+
+def disable_profiling() -> None:
+    global _settings
+    _settings = None
+    _remove_sql_hooks()
+
+
+def profiling_status() -> dict:
+    settings = _active_settings()
+    if settings is None:
+        return {"enabled": False, "stored_profiles": len(_profiles)}
+    return {
+        "enabled": True,
+        "routes": settings.routes,
+        "sample_percent": settings.sample_percent,
+        "explain": settings.explain,
+        "expires_in_seconds": round(settings.expires_at - time.monotonic()),
+        "stored_profiles": len(_profiles),
+    }
+
+
+def _active_settings() -> ProfilingSettings | None:
+    settings = _settings
+    if settings is not None and time.monotonic() >= settings.expires_at:
+        disable_profiling()
+        return None
+    return settings
+
+
+def stored_profiles() -> list[RequestProfile]:
+    return list(reversed(_profiles))
+
+
+def get_profile(profile_id: str) -> RequestProfile | None:
+    return next((p for p in _profiles if p.id == profile_id), None)
+
+
+# --------------------------------------------------
+# SQL capture
+# --------------------------------------------------
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+
+def _redact(parameters, executemany: bool) -> str:
+    """Describe bound parameters by type only, e.g. ``(str, int)``."""
+    if executemany:
+        return f"{len(parameters)} parameter sets"
+    if isinstance(parameters, dict):
+        return repr({name: type(value).__name__ for name, value in parameters.items()})[:500]
+    return "(" + ", ".join(type(value).__name__ for value in parameters or ()) + ")"
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    if profile is None or not conn.info.get("profile_query_start"):
+        return
+    elapsed = (time.perf_counter() - conn.info["profile_query_start"].pop()) * 1000
+    if len(profile.queries) >= PROFILE_MAX_QUERIES:
+        profile.dropped_queries += 1
+        return
+    profile.queries.append(
+        QueryRecord(
+            statement=statement,
+            parameters=_redact(parameters, executemany),
+            duration_ms=elapsed,
+            rowcount=cursor.rowcount,
+            database=conn.engine.url.render_as_string(hide_password=True),
+            engine=conn.engine,
+            raw_parameters=parameters,
+            executemany=executemany,
+        )
+    )
+
+
+def _install_sql_hooks() -> None:
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _remove_sql_hooks() -> None:
+    if event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.remove(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.remove(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _explain(profile: RequestProfile) -> None:
+    """Attach query plans to the profile's reads, once per distinct statement."""
+    plans: dict[tuple[str, str], list[str]] = {}
+    for query in profile.queries:
+        if query.executemany or not _EXPLAINABLE.match(query.statement):
+            continue
+        key = (query.database, query.statement)
+        if key not in plans:
+            if len(plans) >= MAX_EXPLAINS_PER_PROFILE:
+                break
+            plans[key] = _plan_for(query)
+        query.plan = plans[key]
+
+
+def _plan_for(query: QueryRecord) -> list[str]:
+    sqlite = query.engine.dialect.name == "sqlite"
+    prefix = "EXPLAIN QUERY PLAN " if sqlite else "EXPLAIN "
+    try:
+        with query.engine.connect() as conn:
+            rows = conn.exec_driver_sql(prefix + query.statement, query.raw_parameters or ()).all()
+    except Exception as exc:
+        return [f"EXPLAIN failed: {exc}"]
+    if sqlite:
+        # (id, parent, notused, detail); indent by depth like the sqlite3 shell.
+        depth = {0: -1}
+        lines = []
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, -1) + 1
+            lines.append("  " * depth[node_id] + detail)
+        return lines
+    return [" | ".join(str(value) for value in row) for row in rows]
+
+
+# --------------------------------------------------
+# Stack sampling
+# --------------------------------------------------
+class _Sampler:
+    """One background thread sampling the threads of profiled endpoints.
+
+    It only runs while at least one endpoint is being profiled.
+    """
+
+    def __init__(self):
+        self._targets: dict[int, tuple[RequestProfile, object]] = {}
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def add(self, ident: int, profile: RequestProfile, stop_code) -> None:
+        with self._lock:
+            self._targets[ident] = (profile, stop_code)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+
+    def remove(self, ident: int) -> None:
+        with self._lock:
+            self._targets.pop(ident, None)
+
+    def _run(self) -> None:
+        interval = PROFILE_SAMPLE_INTERVAL_MS / 1000
+        while True:
+            with self._lock:
+                if not self._targets:
+                    self._thread = None
+                    return
+                targets = list(self._targets.items())
+            frames = sys._current_frames()
+            for ident, (profile, stop_code) in targets:
+                frame = frames.get(ident)
+                if frame is not None:
+                    profile.samples[_fold(frame, stop_code)] += 1
+            del frames
+            time.sleep(interval)
+
+
+def _fold(frame, stop_code) -> str:
+    """Collapse a stack into ``outer;...;inner``, starting below the endpoint wrapper."""
+    names = []
+    while frame is not None and frame.f_code is not stop_code:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+_sampler = _Sampler()
+
+
+def _profiled(endpoint):
+    """Wrap an endpoint so the thread that runs it is sampled when profiled."""
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            profile = _current.get()
+            if profile is None:
+                return await endpoint(*args, **kwargs)
+            ident = threading.get_ident()
+            _sampler.add(ident, profile, async_wrapper.__code__)
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                _sampler.remove(ident)
+
+        return async_wrapper
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return endpoint(*args, **kwargs)
+        ident = threading.get_ident()
+        _sampler.add(ident, profile, wrapper.__code__)
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            _sampler.remove(ident)
+
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """Route class whose endpoint can be sampled by the request profiler.
+
+    Routers opt in with ``APIRouter(..., route_class=ProfiledRoute)``.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, _profiled(endpoint), **kwargs)
+
+
+# --------------------------------------------------
+# Middleware
+# --------------------------------------------------
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if _settings is None or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        settings = _active_settings()
+        if settings is None or not settings.selects(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(
+            id=uuid.uuid4().hex,
+            method=scope["method"],
+            path=scope["path"],
+            started_at=datetime.now(),
+        )
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                profile.status_code = message["status"]
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (PROFILE_ID_HEADER.lower().encode(), profile.id.encode()),
+                ]
+            await send(message)
+
+        token = _current.set(profile)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profile.duration_ms = (time.perf_counter() - started) * 1000
+            _current.reset(token)
+            # The response has been sent; plans are gathered off the event loop.
+            if settings.explain and profile.queries:
+                await run_in_threadpool(_explain, profile)
+            for query in profile.queries:
+                query.raw_parameters = None
+            with _lock:
+                _profiles.append(profile)
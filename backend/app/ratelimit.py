@@ -0,0 +1,172 @@
+"""Per-caller rate limiting and admission control for heavy report queries.
+
+Requests are sorted into route classes (``report``, ``write``, ``read``).
+Each caller gets a token bucket per class, and report requests must also
+acquire one of ``MAX_CONCURRENT_REPORTS`` slots before they reach the
+endpoint.  A report that cannot get a slot within
+``REPORT_QUEUE_TIMEOUT_SECONDS`` is turned away with 429 + ``Retry-After``,
+so report storms can never occupy the worker threads that desk operations
+such as ``issue-book`` need.
+
+All state is per process; with several workers each enforces its own share.
+"""
+import asyncio
+import json
+import math
+import os
+import time
+from dataclasses import dataclass
+
+from .auth import subject_from_authorization
+
+REPORT_PREFIXES = ("/reports",)
+# Report jobs run off-request; submitting and polling them is cheap.
+REPORT_JOB_PREFIX = "/reports/jobs"
+EXEMPT_PATHS = {"/", "/docs", "/openapi.json", "/redoc"}
+# Frontend files are served from memory and cached by browsers.
+EXEMPT_PREFIXES = ("/app/",)
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+MAX_CONCURRENT_REPORTS = int(os.getenv("MAX_CONCURRENT_REPORTS", "2"))
+REPORT_QUEUE_TIMEOUT_SECONDS = float(os.getenv("REPORT_QUEUE_TIMEOUT_SECONDS", "2"))
+# Buckets idle for this long are full again and can be forgotten.
+BUCKET_IDLE_SECONDS = 600
+
+
+@dataclass(frozen=True)
+class BucketSpec:
+    per_minute: float
+    burst: int
+
+
+def _spec(name: str, per_minute: int, burst: int) -> BucketSpec:
+    return BucketSpec(
+        per_minute=float(os.getenv(f"RATE_LIMIT_{name}_PER_MINUTE", str(per_minute))),
+        burst=int(os.getenv(f"RATE_LIMIT_{name}_BURST", str(burst))),
+    )
+
+
+ROUTE_CLASS_LIMITS = {
+    "report": _spec("REPORT", 30, 10),
+    "write": _spec("WRITE", 240, 40),
+    "read": _spec("READ", 600, 100),
+}
+
+
+def route_class(method: str, path: str) -> str:
+    if path.startswith(REPORT_PREFIXES) and not path.startswith(REPORT_JOB_PREFIX):
+        return "report"
+    if method in WRITE_METHODS:
+        return "write"
+    return "read"
+
+
+class TokenBuckets:
+    def __init__(self, limits: dict[str, BucketSpec]):
+        self.limits = limits
+        self._buckets: dict[tuple[str, str], list[float]] = {}
+        self._last_prune = time.monotonic()
+
+    def take(self, caller: str, klass: str) -> float:
+        """Consume one token; return 0 on success or seconds until one is free."""
+        spec = self.limits[klass]
+        if spec.per_minute <= 0:
+            return 0.0
+        rate = spec.per_minute / 60.0
+        now = time.monotonic()
+        self._maybe_prune(now)
+
+        bucket = self._buckets.get((caller, klass))
+        if bucket is None:
+            bucket = self._buckets[(caller, klass)] = [float(spec.burst), now]
+        tokens, updated = bucket
+        tokens = min(float(spec.burst), tokens + (now - updated) * rate)
+        if tokens >= 1.0:
+            bucket[0], bucket[1] = tokens - 1.0, now
+            return 0.0
+        bucket[0], bucket[1] = tokens, now
+        return (1.0 - tokens) / rate
+
+    def _maybe_prune(self, now: float) -> None:
+        if now - self._last_prune < BUCKET_IDLE_SECONDS:
+            return
+        self._last_prune = now
+        stale = [k for k, (_, updated) in self._buckets.items() if now - updated > BUCKET_IDLE_SECONDS]
+        for key in stale:
+            del self._buckets[key]
+
+
+class AdmissionControlMiddleware:
+    """ASGI middleware enforcing the token buckets and the report slot cap."""
+
+    def __init__(
+        self,
+        app,
+        limits: dict[str, BucketSpec] | None = None,
+        max_concurrent_reports: int = MAX_CONCURRENT_REPORTS,
+        report_queue_timeout: float = REPORT_QUEUE_TIMEOUT_SECONDS,
+    ):
+        self.app = app
+        self.buckets = TokenBuckets(limits or ROUTE_CLASS_LIMITS)
+        self.max_concurrent_reports = max_concurrent_reports
+        self.report_queue_timeout = report_queue_timeout
+        self._report_slots: asyncio.Semaphore | None = None
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] == "OPTIONS"
+            or scope["path"] in EXEMPT_PATHS
+            or scope["path"].startswith(EXEMPT_PREFIXES)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        klass = route_class(scope["method"], scope["path"])
+        wait = self.buckets.take(self._caller(scope), klass)
+        if wait > 0:
+            await _too_many_requests(send, wait, "Rate limit exceeded")
+            return
+
+        if klass != "report" or self.max_concurrent_reports <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        if self._report_slots is None:
+            self._report_slots = asyncio.Semaphore(self.max_concurrent_reports)
+        try:
+            await asyncio.wait_for(self._report_slots.acquire(), self.report_queue_timeout)
+        except asyncio.TimeoutError:
+            await _too_many_requests(send, self.report_queue_timeout, "Too many report queries in progress")
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._report_slots.release()
+
+    @staticmethod
+    def _caller(scope) -> str:
+        for name, value in scope.get("headers", []):
+            if name == b"authorization":
+                subject = subject_from_authorization(value.decode("latin-1"))
+                if subject:
+                    return f"user:{subject}"
+                break
+        client = scope.get("client")
+        return f"ip:{client[0]}" if client else "anonymous"
+
+
+async def _too_many_requests(send, retry_after: float, detail: str) -> None:
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode("latin-1")),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
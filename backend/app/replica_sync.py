@@ -0,0 +1,69 @@
+"""Keep local SQLite read replicas in sync with the primary for development.
+
+Usage (from ``backend/``)::
+
+    export READ_DATABASE_URLS=sqlite:///./library_replica.db
+    python -m app.replica_sync --interval 5
+
+Copies ``DATABASE_URL`` into every SQLite URL in ``READ_DATABASE_URLS`` with
+the online backup API, once or every ``--interval`` seconds.  Replicas lag
+the primary by up to one interval, which is what read-your-writes
+stickiness in ``get_read_db`` (app.dependencies) covers.  Non-SQLite replicas (e.g. a MySQL
+replica in a container) are kept in sync by the database itself and are
+skipped here.
+"""
+import argparse
+import sqlite3
+import time
+
+from sqlalchemy.engine import make_url
+
+from .database import DATABASE_URL, READ_DATABASE_URLS
+
+
+def _sqlite_path(url: str) -> str | None:
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite" or not parsed.database:
+        return None
+    return parsed.database
+
+
+def sync_once(source_url: str = DATABASE_URL, replica_urls: list[str] = READ_DATABASE_URLS) -> int:
+    source_path = _sqlite_path(source_url)
+    if not source_path:
+        raise SystemExit("replica_sync only supports a SQLite primary")
+
+    copied = 0
+    source = sqlite3.connect(source_path)
+    try:
+        for url in replica_urls:
+            target_path = _sqlite_path(url)
+            if not target_path or target_path == source_path:
+                continue
+            target = sqlite3.connect(target_path)
+            try:
+                source.backup(target)
+                copied += 1
+            finally:
+                target.close()
+    finally:
+        source.close()
+    return copied
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Copy the SQLite primary into its read replicas.")
+    parser.add_argument("--interval", type=float, default=0, help="seconds between syncs; 0 syncs once")
+    args = parser.parse_args()
+
+    while True:
+        started = time.perf_counter()
+        copied = sync_once()
+        print(f"synced {copied} replica(s) in {(time.perf_counter() - started) * 1000:.1f}ms", flush=True)
+        if args.interval <= 0:
+            return
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
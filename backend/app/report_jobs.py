@@ -0,0 +1,358 @@
+"""Background report jobs with de-duplication and result caching.
+
+A job renders one report to a CSV file on a local thread pool, streaming
+rows from the database in chunks so memory stays flat regardless of
+history size.  Job state lives in ``report_jobs`` so any worker process can
+answer status and download requests.
+
+Identical requests (same report and parameters) share one job while it is
+queued or running (a unique ``in_flight_key`` enforces this across worker
+processes), and a finished result is reused for as long as the
+circulation event sequences (see ``events.py``) of the partitions it read
+have not moved past the version the result was built from.  Reports that
+depend on the current date also key on the day they were submitted for.
+
+Long maintenance tasks (see ``submit_task_job``) run on the same pool and
+report their outcome as a small CSV; at most one of each kind runs at once.
+
+Each process tags the jobs it accepts with its ``WORKER_ID`` and renews a
+lease on them every ``REPORT_JOB_LEASE_SECONDS / 3``.  Jobs whose lease has
+lapsed belonged to a process that died; ``fail_interrupted_jobs`` marks only
+those as failed, so a restarting worker leaves its siblings' jobs alone.
+"""
+import asyncio
+import csv
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Callable
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Query, Session
+from starlette.concurrency import run_in_threadpool
+
+from .branches import fan_out
+from .database import SessionLocal, partition_session, partitions
+from .events import latest_sequence
+from .models import ReportJob
+
+REPORT_JOBS_DIR = os.getenv("REPORT_JOBS_DIR", "./report_jobs")
+REPORT_JOB_WORKERS = int(os.getenv("REPORT_JOB_WORKERS", "2"))
+REPORT_JOB_CHUNK_ROWS = int(os.getenv("REPORT_JOB_CHUNK_ROWS", "1000"))
+# A queued/running job whose owner has not renewed it for this long is failed.
+REPORT_JOB_LEASE_SECONDS = int(os.getenv("REPORT_JOB_LEASE_SECONDS", "120"))
+
+WORKER_ID = uuid.uuid4().hex  # identifies this process's jobs
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_EXPIRED = "expired"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ReportDefinition:
+    columns: list[str]
+    query: Callable[[Session, dict, list[str]], Query]  # (db, params, branches in that db)
+    row: Callable[[Any], dict]
+    dated: bool = False  # result depends on date.today(); jobs pin params["as_of"]
+
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=REPORT_JOB_WORKERS, thread_name_prefix="report-job")
+        return _executor
+
+
+def _dedup_key(report_type: str, params_json: str) -> str:
+    return hashlib.sha256(f"{report_type}\0{params_json}".encode("utf-8")).hexdigest()
+
+
+def _branches(params: dict) -> list[str] | None:
+    return [params["branch"]] if params.get("branch") else None
+
+
+def data_version(branches: list[str] | None = None) -> int:
+    """Sum of the partitions' feed sequences; it grows whenever any of them does."""
+    return sum(fan_out(lambda db, _: latest_sequence(db), branches, read=False))
+
+
+def submit_report_job(
+    db: Session,
+    report_type: str,
+    definition: ReportDefinition,
+    params: dict,
+    requested_by: int | None = None,
+) -> tuple[ReportJob, str]:
+    """Return ``(job, how)`` where ``how`` is ``queued``, ``deduplicated`` or ``cached``."""
+    if definition.dated:
+        params = {**params, "as_of": date.today().isoformat()}
+    params_json = json.dumps(params, sort_keys=True, default=str)
+    key = _dedup_key(report_type, params_json)
+
+    in_flight = _in_flight(db, key)
+    if in_flight:
+        return in_flight, "deduplicated"
+
+    cached = (
+        db.query(ReportJob)
+        .filter(
+            ReportJob.dedup_key == key,
+            ReportJob.status == JOB_DONE,
+            ReportJob.data_version == data_version(_branches(params)),
+        )
+        .first()
+    )
+    if cached:
+        return cached, "cached"
+
+    job, created = _claim(db, report_type, params_json, key, requested_by)
+    if not created:
+        return job, "deduplicated"
+    _pool().submit(_run_job, job.id, definition, params)
+    return job, "queued"
+
+
+def submit_task_job(
+    db: Session,
+    task_type: str,
+    columns: list[str],
+    task: Callable[[], list[dict]],
+    requested_by: int | None = None,
+) -> tuple[ReportJob, str]:
+    """Run ``task`` in the background and keep the rows it returns as the
+    job's CSV.  Returns ``(job, how)`` like ``submit_report_job``; a task
+    already queued or running is ``deduplicated``, results are never reused."""
+    key = _dedup_key(task_type, "{}")
+    job, created = _claim(db, task_type, "{}", key, requested_by)
+    if not created:
+        return job, "deduplicated"
+    _pool().submit(_run_task, job.id, columns, task)
+    return job, "queued"
+
+
+def _in_flight(db: Session, key: str) -> ReportJob | None:
+    return db.query(ReportJob).filter(ReportJob.in_flight_key == key).first()
+
+
+def _claim(
+    db: Session, job_type: str, params_json: str, key: str, requested_by: int | None
+) -> tuple[ReportJob, bool]:
+    """Queue a job for ``key`` unless one is already queued or running.
+
+    Returns ``(job, created)``.  The unique ``in_flight_key`` makes the check
+    hold across worker processes: the loser of a race gets an IntegrityError
+    and returns the winner's job.
+    """
+    for _ in range(3):
+        in_flight = _in_flight(db, key)
+        if in_flight:
+            return in_flight, False
+        job = ReportJob(
+            id=uuid.uuid4().hex,
+            report_type=job_type,
+            params=params_json,
+            dedup_key=key,
+            in_flight_key=key,
+            status=JOB_QUEUED,
+            requested_by=requested_by,
+            created_at=datetime.now(),
+            worker_id=WORKER_ID,
+            heartbeat_at=datetime.now(),
+        )
+        try:
+            with db.begin_nested():
+                db.add(job)
+        except IntegrityError:
+            db.rollback()  # queued concurrently; look again from a fresh transaction
+            continue
+        db.commit()
+        db.refresh(job)
+        return job, True
+    raise RuntimeError(f"Could not queue or find an in-flight job for {job_type}")
+
+
+def _set_status(job_id: str, **values) -> None:
+    if values.get("status") in (JOB_DONE, JOB_FAILED):
+        values["in_flight_key"] = None  # frees the key for the next request
+    db = SessionLocal()
+    try:
+        db.query(ReportJob).filter(ReportJob.id == job_id).update(values)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _run_job(job_id: str, definition: ReportDefinition, params: dict) -> None:
+    _set_status(job_id, status=JOB_RUNNING, started_at=datetime.now())
+    os.makedirs(REPORT_JOBS_DIR, exist_ok=True)
+    final_path = os.path.join(REPORT_JOBS_DIR, f"{job_id}.csv")
+    partial_path = final_path + ".part"
+
+    try:
+        version = 0
+        rows = 0
+        with open(partial_path, "w", newline="", encoding="utf-8") as handle:
+            writer = csv.DictWriter(handle, fieldnames=definition.columns)
+            writer.writeheader()
+            # Partitions are written one after another so memory stays flat.
+            for url, branches in partitions(_branches(params)).items():
+                db = partition_session(url, read=True)
+                try:
+                    # Read the version from the same database as the rows, so a
+                    # lagging replica yields an older version instead of a
+                    # falsely fresh cache.
+                    version += latest_sequence(db)
+                    for record in definition.query(db, params, branches).yield_per(REPORT_JOB_CHUNK_ROWS):
+                        writer.writerow(definition.row(record))
+                        rows += 1
+                        if rows % REPORT_JOB_CHUNK_ROWS == 0:
+                            handle.flush()
+                finally:
+                    db.close()
+        os.replace(partial_path, final_path)
+    except Exception as exc:
+        logger.exception("Report job %s failed", job_id)
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        _set_status(job_id, status=JOB_FAILED, error=str(exc), finished_at=datetime.now())
+        return
+
+    _set_status(
+        job_id,
+        status=JOB_DONE,
+        data_version=version,
+        result_path=final_path,
+        row_count=rows,
+        finished_at=datetime.now(),
+    )
+    _expire_superseded(job_id)
+
+
+def _run_task(job_id: str, columns: list[str], task: Callable[[], list[dict]]) -> None:
+    _set_status(job_id, status=JOB_RUNNING, started_at=datetime.now())
+    os.makedirs(REPORT_JOBS_DIR, exist_ok=True)
+    final_path = os.path.join(REPORT_JOBS_DIR, f"{job_id}.csv")
+
+    try:
+        rows = task()
+        with open(final_path + ".part", "w", newline="", encoding="utf-8") as handle:
+            writer = csv.DictWriter(handle, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(rows)
+        os.replace(final_path + ".part", final_path)
+    except Exception as exc:
+        logger.exception("Job %s failed", job_id)
+        if os.path.exists(final_path + ".part"):
+            os.remove(final_path + ".part")
+        _set_status(job_id, status=JOB_FAILED, error=str(exc), finished_at=datetime.now())
+        return
+
+    _set_status(job_id, status=JOB_DONE, result_path=final_path, row_count=len(rows), finished_at=datetime.now())
+    _expire_superseded(job_id)
+
+
+def _expire_superseded(job_id: str) -> None:
+    """Drop older finished results for the same request once a newer one exists."""
+    db = SessionLocal()
+    try:
+        job = db.get(ReportJob, job_id)
+        older = (
+            db.query(ReportJob)
+            .filter(
+                ReportJob.dedup_key == job.dedup_key,
+                ReportJob.status == JOB_DONE,
+                ReportJob.id != job.id,
+            )
+            .all()
+        )
+        for old in older:
+            if old.result_path and os.path.exists(old.result_path):
+                os.remove(old.result_path)
+            old.status = JOB_EXPIRED
+            old.result_path = None
+        db.commit()
+    finally:
+        db.close()
+
+
+def renew_leases() -> int:
+    """Extend the lease on every unfinished job this process owns."""
+    db = SessionLocal()
+    try:
+        count = (
+            db.query(ReportJob)
+            .filter(ReportJob.worker_id == WORKER_ID, ReportJob.status.in_([JOB_QUEUED, JOB_RUNNING]))
+            .update({"heartbeat_at": datetime.now()}, synchronize_session=False)
+        )
+        db.commit()
+        return count
+    finally:
+        db.close()
+
+
+def fail_interrupted_jobs(now: datetime | None = None) -> int:
+    """Mark queued/running jobs whose owner stopped renewing their lease as failed."""
+    now = now or datetime.now()
+    db = SessionLocal()
+    try:
+        count = (
+            db.query(ReportJob)
+            .filter(
+                ReportJob.status.in_([JOB_QUEUED, JOB_RUNNING]),
+                or_(ReportJob.worker_id.is_(None), ReportJob.worker_id != WORKER_ID),
+                or_(
+                    ReportJob.heartbeat_at.is_(None),
+                    ReportJob.heartbeat_at < now - timedelta(seconds=REPORT_JOB_LEASE_SECONDS),
+                ),
+            )
+            .update(
+                {"status": JOB_FAILED, "error": "Interrupted by restart", "finished_at": now, "in_flight_key": None},
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        return count
+    finally:
+        db.close()
+
+
+def _lease_once() -> int:
+    renew_leases()
+    return fail_interrupted_jobs()
+
+
+async def run_lease_renewals(interval_seconds: float = REPORT_JOB_LEASE_SECONDS / 3) -> None:
+    """Renew this process's leases and fail abandoned jobs until cancelled."""
+    while True:
+        try:
+            failed = await run_in_threadpool(_lease_once)
+            if failed:
+                logger.info("Failed %d report jobs abandoned by stopped workers", failed)
+        except Exception:
+            logger.exception("Report job lease renewal failed")
+        await asyncio.sleep(interval_seconds)
+
+
+def shutdown_report_jobs() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
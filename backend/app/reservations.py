@@ -0,0 +1,181 @@
+"""Per-title FIFO hold queues.
+
+Holds are plain rows ordered by primary key within a title.  The composite
+``(title_id, status, id)`` index means finding the next member in line is a
+single index seek regardless of how many holds are outstanding.
+
+A copy set aside for a ready hold waits ``HOLD_PICKUP_DAYS``; after that
+the pickup sweep expires the hold and passes the copy to the next member
+in line, or back to the shelf.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from .branches import fan_out
+from .inventory import claim_specific_copy, release_copy
+from .models import Book, Hold, Transaction
+
+HOLD_WAITING = "waiting"
+HOLD_READY = "ready"
+HOLD_FULFILLED = "fulfilled"
+HOLD_CANCELLED = "cancelled"
+HOLD_EXPIRED = "expired"
+
+HOLD_PICKUP_DAYS = int(os.getenv("HOLD_PICKUP_DAYS", "7"))
+HOLD_SWEEP_INTERVAL_SECONDS = int(os.getenv("HOLD_SWEEP_INTERVAL_SECONDS", str(60 * 60)))
+
+_ASSIGN_ATTEMPTS = 5
+
+logger = logging.getLogger(__name__)
+
+
+def next_waiting_hold(db: Session, title_id: int) -> Hold | None:
+    return (
+        db.query(Hold)
+        .filter(Hold.title_id == title_id, Hold.status == HOLD_WAITING)
+        .order_by(Hold.id)
+        .limit(1)
+        .first()
+    )
+
+
+def queue_position(db: Session, hold: Hold) -> int:
+    if hold.status != HOLD_WAITING:
+        return 0
+    ahead = (
+        db.query(Hold.id)
+        .filter(
+            Hold.title_id == hold.title_id,
+            Hold.status == HOLD_WAITING,
+            Hold.id < hold.id,
+        )
+        .count()
+    )
+    return ahead + 1
+
+
+def assign_to_next_hold(db: Session, book: Book) -> Hold | None:
+    """Hand an unavailable copy to the head of its title's queue.
+
+    The caller must already own ``book`` (i.e. it is marked unavailable and
+    excluded from the title's ``available_copies``).  Runs inside the
+    caller's transaction; returns the hold that received the copy, or
+    ``None`` when nobody is waiting.
+    """
+    for _ in range(_ASSIGN_ATTEMPTS):
+        hold = next_waiting_hold(db, book.title_id)
+        if not hold:
+            return None
+        claimed = db.execute(
+            update(Hold)
+            .where(Hold.id == hold.id, Hold.status == HOLD_WAITING)
+            .values(status=HOLD_READY, book_id=book.id, ready_at=datetime.now())
+        )
+        if claimed.rowcount == 1:
+            db.refresh(hold)
+            return hold
+    return None
+
+
+def pass_on_copy(db: Session, book: Book) -> Hold | None:
+    """Give ``book`` to the next waiting member, or put it back on the shelf."""
+    hold = assign_to_next_hold(db, book)
+    if not hold:
+        release_copy(db, book)
+    return hold
+
+
+def ready_hold_for(
+    db: Session,
+    user_id: int,
+    title_id: int | None = None,
+    book_id: int | None = None,
+) -> Hold | None:
+    query = db.query(Hold).filter(Hold.user_id == user_id, Hold.status == HOLD_READY)
+    if title_id is not None:
+        query = query.filter(Hold.title_id == title_id)
+    if book_id is not None:
+        query = query.filter(Hold.book_id == book_id)
+    return query.first()
+
+
+def pickup_deadline(hold: Hold) -> datetime | None:
+    return hold.ready_at + timedelta(days=HOLD_PICKUP_DAYS) if hold.ready_at else None
+
+
+def collect_hold(db: Session, hold: Hold) -> bool:
+    """Mark a ready hold fulfilled if its copy is still set aside for it.
+
+    Returns ``False`` (changing nothing) if the hold was already collected,
+    cancelled or expired, or its copy has gone out on another loan.
+    """
+    book = hold.book
+    on_loan = (
+        db.query(Transaction.id)
+        .filter(Transaction.book_id == book.id, Transaction.return_date == None)
+        .first()
+    )
+    if on_loan:
+        return False
+    if book.available and not claim_specific_copy(db, book):
+        # It was put back on the shelf and someone else took it.
+        return False
+    collected = db.execute(
+        update(Hold)
+        .where(Hold.id == hold.id, Hold.status == HOLD_READY)
+        .values(status=HOLD_FULFILLED)
+    )
+    if collected.rowcount != 1:
+        return False
+    db.refresh(hold)
+    return True
+
+
+def expire_uncollected_holds(db: Session, now: datetime | None = None) -> int:
+    """Expire ready holds past their pickup deadline and pass their copies on.
+
+    Returns the number of holds expired.
+    """
+    cutoff = (now or datetime.now()) - timedelta(days=HOLD_PICKUP_DAYS)
+    stale = (
+        db.query(Hold)
+        .filter(Hold.status == HOLD_READY, Hold.ready_at < cutoff)
+        .order_by(Hold.id)
+        .all()
+    )
+    expired = 0
+    for hold in stale:
+        taken = db.execute(
+            update(Hold)
+            .where(Hold.id == hold.id, Hold.status == HOLD_READY)
+            .values(status=HOLD_EXPIRED)
+        )
+        if taken.rowcount != 1:
+            continue  # collected or cancelled meanwhile
+        expired += 1
+        if hold.book is not None and not hold.book.available:
+            pass_on_copy(db, hold.book)
+    db.commit()
+    return expired
+
+
+def _sweep_once() -> int:
+    return sum(fan_out(lambda db, _: expire_uncollected_holds(db), read=False))
+
+
+async def run_pickup_sweeps(interval_seconds: int = HOLD_SWEEP_INTERVAL_SECONDS) -> None:
+    """Run the pickup sweep now and then every ``interval_seconds`` until cancelled."""
+    while True:
+        try:
+            expired = await run_in_threadpool(_sweep_once)
+            if expired:
+                logger.info("Expired %d uncollected holds", expired)
+        except Exception:
+            logger.exception("Hold pickup sweep failed")
+        await asyncio.sleep(interval_seconds)
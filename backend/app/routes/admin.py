@@ -1,9 +1,21 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+
 from ..dependencies import require_admin
+from ..profiling import (
+    ProfiledRoute,
+    disable_profiling,
+    enable_profiling,
+    get_profile,
+    profiling_status,
+    stored_profiles,
+)
+from ..schemas import ProfilingRequest
 
 router = APIRouter(
     prefix="/admin",
-    tags=["Admin"]
+    tags=["Admin"],
+    route_class=ProfiledRoute,
 )
 
 @router.get("/home")
@@ -15,3 +27,59 @@ def admin_home(_: dict = Depends(require_admin)):
             "Transactions"
         ]
     }
+
+
+# --------------------------------------------------
+# Request profiling
+# --------------------------------------------------
+@router.get("/profiling")
+def get_profiling(_: dict = Depends(require_admin)):
+    return profiling_status()
+
+
+@router.put("/profiling")
+def start_profiling(
+    payload: ProfilingRequest,
+    request: Request,
+    _: dict = Depends(require_admin),
+):
+    if not payload.routes and payload.sample_percent == 0:
+        raise HTTPException(status_code=400, detail="Give routes to profile or a sample percentage")
+    known = request.app.openapi()["paths"]
+    unknown = [route for route in payload.routes if route not in known]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown routes: {', '.join(unknown)}")
+    return enable_profiling(
+        payload.routes,
+        payload.sample_percent,
+        payload.duration_seconds,
+        explain=payload.explain,
+    )
+
+
+@router.delete("/profiling")
+def stop_profiling(_: dict = Depends(require_admin)):
+    disable_profiling()
+    return profiling_status()
+
+
+@router.get("/profiles")
+def list_profiles(_: dict = Depends(require_admin)):
+    return [profile.summary() for profile in stored_profiles()]
+
+
+@router.get("/profiles/{profile_id}")
+def profile_detail(profile_id: str, _: dict = Depends(require_admin)):
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile.detail()
+
+
+@router.get("/profiles/{profile_id}/folded", response_class=PlainTextResponse)
+def profile_folded(profile_id: str, _: dict = Depends(require_admin)):
+    """Folded stacks for flamegraph.pl, speedscope or inferno."""
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile.folded()
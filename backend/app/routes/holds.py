@@ -0,0 +1,159 @@
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from ..branches import current_branch, get_branch_db, get_branch_read_db
+from ..dependencies import get_tracked_db, require_user_or_admin
+from ..models import Hold, Title, User
+from ..profiling import ProfiledRoute
+from ..reservations import (
+    HOLD_CANCELLED,
+    HOLD_READY,
+    HOLD_WAITING,
+    pass_on_copy,
+    pickup_deadline,
+    queue_position,
+)
+from ..schemas import HoldCancelRequest, HoldPlaceRequest
+
+router = APIRouter(prefix="/holds", tags=["Holds"], route_class=ProfiledRoute)
+
+
+def _hold_row(h: Hold, position: int) -> dict:
+    return {
+        "hold_id": h.id,
+        "title_id": h.title_id,
+        "user_id": h.user_id,
+        "book_id": h.book_id,
+        "status": h.status,
+        "position": position,
+        "placed_at": h.placed_at,
+        "ready_at": h.ready_at,
+        "pickup_by": pickup_deadline(h),
+    }
+
+
+@router.post("/place-hold")
+def place_hold(
+    payload: HoldPlaceRequest,
+    branch: str = Depends(current_branch),
+    db: Session = Depends(get_tracked_db),
+    branch_db: Session = Depends(get_branch_db),
+    _: User = Depends(require_user_or_admin),
+):
+    user = db.query(User).filter(User.id == payload.user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    title = branch_db.query(Title).filter(Title.id == payload.title_id, Title.branch == branch).first()
+    if not title:
+        raise HTTPException(status_code=404, detail="Title not found")
+    if title.available_copies > 0:
+        raise HTTPException(status_code=400, detail="Copies are available, issue directly")
+
+    existing = (
+        branch_db.query(Hold)
+        .filter(
+            Hold.user_id == payload.user_id,
+            Hold.title_id == payload.title_id,
+            Hold.status.in_([HOLD_WAITING, HOLD_READY]),
+        )
+        .first()
+    )
+    if existing:
+        raise HTTPException(status_code=400, detail="User already has a hold on this title")
+
+    hold = Hold(
+        title_id=title.id,
+        user_id=user.id,
+        status=HOLD_WAITING,
+        placed_at=datetime.now(),
+    )
+    branch_db.add(hold)
+    branch_db.commit()
+    branch_db.refresh(hold)
+    return {
+        "message": "Hold placed successfully",
+        "hold_id": hold.id,
+        "position": queue_position(branch_db, hold),
+    }
+
+
+@router.put("/cancel-hold")
+def cancel_hold(
+    payload: HoldCancelRequest,
+    branch: str = Depends(current_branch),
+    db: Session = Depends(get_branch_db),
+    _: User = Depends(require_user_or_admin),
+):
+    hold = (
+        db.query(Hold)
+        .join(Title, Title.id == Hold.title_id)
+        .filter(
+            Hold.id == payload.hold_id,
+            Title.branch == branch,
+            Hold.status.in_([HOLD_WAITING, HOLD_READY]),
+        )
+        .first()
+    )
+    if not hold:
+        raise HTTPException(status_code=404, detail="Active hold not found")
+
+    was_ready = hold.status == HOLD_READY
+    book = hold.book
+    hold.status = HOLD_CANCELLED
+    hold.book_id = None
+    db.flush()
+    if was_ready and book:
+        pass_on_copy(db, book)
+    db.commit()
+    return {"message": "Hold cancelled"}
+
+
+@router.get("/title/{title_id}")
+def title_holds(
+    title_id: int,
+    branch: str = Depends(current_branch),
+    db: Session = Depends(get_branch_read_db),
+    _: User = Depends(require_user_or_admin),
+):
+    holds = (
+        db.query(Hold)
+        .join(Title, Title.id == Hold.title_id)
+        .filter(
+            Hold.title_id == title_id,
+            Title.branch == branch,
+            Hold.status.in_([HOLD_WAITING, HOLD_READY]),
+        )
+        .order_by(Hold.id)
+        .all()
+    )
+    rows = []
+    waiting = 0
+    for h in holds:
+        if h.status == HOLD_WAITING:
+            waiting += 1
+        rows.append(_hold_row(h, waiting if h.status == HOLD_WAITING else 0))
+    return rows
+
+
+@router.get("/user/{user_id}")
+def user_holds(
+    user_id: int,
+    branch: str = Depends(current_branch),
+    db: Session = Depends(get_branch_read_db),
+    _: User = Depends(require_user_or_admin),
+):
+    holds = (
+        db.query(Hold)
+        .join(Title, Title.id == Hold.title_id)
+        .filter(
+            Hold.user_id == user_id,
+            Title.branch == branch,
+            Hold.status.in_([HOLD_WAITING, HOLD_READY]),
+        )
+        .order_by(Hold.id)
+        .all()
+    )
+    return [_hold_row(h, queue_position(db, h)) for h in holds]
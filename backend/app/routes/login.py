@@ -2,11 +2,12 @@ from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
 
 from ..auth import create_access_token, verify_password
-from ..database import get_db
+from ..database import LIBRARY_BRANCHES, get_db
 from ..models import User
+from ..profiling import ProfiledRoute
 from ..schemas import LoginRequest, LoginResponse
 
-router = APIRouter(prefix="/auth", tags=["Authentication"])
+router = APIRouter(prefix="/auth", tags=["Authentication"], route_class=ProfiledRoute)
 
 
 @router.post("/login", response_model=LoginResponse)
@@ -16,4 +17,4 @@ def login(data: LoginRequest, db: Session = Depends(get_db)):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     token = create_access_token({"sub": str(user.id), "role": user.role})
-    return {"role": user.role, "access_token": token, "token_type": "bearer"}
+    return {"role": user.role, "access_token": token, "token_type": "bearer", "branches": LIBRARY_BRANCHES}
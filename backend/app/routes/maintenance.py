@@ -1,12 +1,20 @@
-from datetime import date, datetime, timedelta
+from datetime import date, timedelta
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
 from sqlalchemy.orm import Session
 
 from ..auth import hash_password
-from ..database import get_db
-from ..dependencies import require_admin
-from ..models import Book, Membership, User
+from ..branches import current_branch, fan_out, get_branch_db
+from ..dependencies import get_read_db, get_tracked_db, require_admin
+from ..events import EVENT_BOOK_UPDATED, record_event
+from ..fines import recompute_pending_fines
+from ..idempotency import IdempotentRoute
+from ..inventory import adjust_counts, get_or_create_title
+from ..memberships import expire_lapsed_memberships, invalidate_membership
+from ..models import Book, Hold, Membership, Transaction, User
+from ..onboarding import IMPORT_MAX_UPLOAD_BYTES, import_members
+from ..report_jobs import submit_task_job
+from ..reservations import HOLD_READY, pass_on_copy
 from ..schemas import (
     BookCreateRequest,
     BookUpdateRequest,
@@ -14,45 +22,49 @@ from ..schemas import (
     MembershipUpdateRequest,
     UserManageRequest,
 )
+from ..sequences import membership_numbers
 
-router = APIRouter(prefix="/maintenance", tags=["Maintenance"])
-
-
-def _membership_number() -> str:
-    return f"M-{date.today().strftime('%Y%m%d')}"
+router = APIRouter(prefix="/maintenance", tags=["Maintenance"], route_class=IdempotentRoute)
 
 
 @router.post("/add-book")
 def add_book(
     payload: BookCreateRequest,
-    db: Session = Depends(get_db),
+    branch: str = Depends(current_branch),
+    db: Session = Depends(get_branch_db),
     _: User = Depends(require_admin),
 ):
     existing = db.query(Book).filter(Book.serial_no == payload.serial_no).first()
     if existing:
         raise HTTPException(status_code=400, detail="Duplicate serial number")
 
-    book = Book(
-        media_type=payload.media_type,
+    title = get_or_create_title(
+        db,
         title=payload.title.strip(),
         author=payload.author.strip(),
-        serial_no=payload.serial_no.strip(),
+        media_type=payload.media_type,
         category=payload.category.strip(),
-        available=True,
+        branch=branch,
     )
+    # New copies start checked out so a waiting hold can take them first.
+    book = Book(branch=branch, title_id=title.id, serial_no=payload.serial_no.strip(), available=False)
     db.add(book)
+    db.flush()
+    adjust_counts(db, title.id, total=1)
+    pass_on_copy(db, book)
     db.commit()
     db.refresh(book)
-    return {"message": "Book added successfully", "book_id": book.id}
+    return {"message": "Book added successfully", "book_id": book.id, "title_id": title.id}
 
 
 @router.put("/update-book")
 def update_book(
     payload: BookUpdateRequest,
-    db: Session = Depends(get_db),
+    branch: str = Depends(current_branch),
+    db: Session = Depends(get_branch_db),
     _: User = Depends(require_admin),
 ):
-    book = db.query(Book).filter(Book.id == payload.book_id).first()
+    book = db.query(Book).filter(Book.id == payload.book_id, Book.branch == branch).first()
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
 
@@ -64,12 +76,47 @@ def update_book(
     if duplicate:
         raise HTTPException(status_code=400, detail="Duplicate serial number")
 
-    book.media_type = payload.media_type
-    book.title = payload.title.strip()
-    book.author = payload.author.strip()
+    if payload.available and not book.available:
+        held = db.query(Hold.id).filter(Hold.book_id == book.id, Hold.status == HOLD_READY).first()
+        if held:
+            raise HTTPException(status_code=400, detail="Copy is set aside for a hold; cancel the hold first")
+        on_loan = (
+            db.query(Transaction.id)
+            .filter(Transaction.book_id == book.id, Transaction.return_date.is_(None))
+            .first()
+        )
+        if on_loan:
+            raise HTTPException(status_code=400, detail="Copy is on loan; complete the return first")
+
+    title = get_or_create_title(
+        db,
+        title=payload.title.strip(),
+        author=payload.author.strip(),
+        media_type=payload.media_type,
+        category=payload.category.strip(),
+        branch=branch,
+    )
+    title.category = payload.category.strip()
+
+    was_available = 1 if book.available else 0
+    now_available = 1 if payload.available else 0
+    if title.id != book.title_id:
+        adjust_counts(db, book.title_id, total=-1, available=-was_available)
+        adjust_counts(db, title.id, total=1, available=now_available)
+    else:
+        adjust_counts(db, title.id, available=now_available - was_available)
+
+    book.title_id = title.id
     book.serial_no = payload.serial_no.strip()
-    book.category = payload.category.strip()
     book.available = payload.available
+    record_event(
+        db,
+        EVENT_BOOK_UPDATED,
+        book_id=book.id,
+        title_id=title.id,
+        serial_no=book.serial_no,
+        available=book.available,
+    )
     db.commit()
     return {"message": "Book updated successfully"}
 
@@ -77,13 +124,15 @@ def update_book(
 @router.post("/add-membership")
 def add_membership(
     payload: MembershipCreateRequest,
-    db: Session = Depends(get_db),
+    branch: str = Depends(current_branch),
+    db: Session = Depends(get_tracked_db),
     _: User = Depends(require_admin),
 ):
     start_date = date.today()
     end_date = start_date + timedelta(days=payload.duration_months * 30)
     membership = Membership(
-        membership_number=f"{_membership_number()}-{datetime.now().strftime('%H%M%S%f')}",
+        membership_number=membership_numbers(db)[0],
+        branch=branch,
         name=payload.member_name.strip(),
         membership_type=f"{payload.duration_months}_months",
         start_date=start_date,
@@ -99,10 +148,29 @@ def add_membership(
     }
 
 
+@router.post("/bulk-import")
+def bulk_import(
+    file: UploadFile = File(...),
+    branch: str = Depends(current_branch),
+    db: Session = Depends(get_tracked_db),
+    _: User = Depends(require_admin),
+):
+    # Read at most one byte past the limit, so an oversized file is never held whole.
+    data = file.file.read(IMPORT_MAX_UPLOAD_BYTES + 1)
+    if len(data) > IMPORT_MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"File exceeds {IMPORT_MAX_UPLOAD_BYTES} bytes")
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="File must be UTF-8 CSV") from None
+    result = import_members(db, text, branch=branch)
+    return {"message": "Import completed", **result}
+
+
 @router.put("/update-membership")
 def update_membership(
     payload: MembershipUpdateRequest,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_tracked_db),
     _: User = Depends(require_admin),
 ):
     membership = (
@@ -115,29 +183,64 @@ def update_membership(
 
     if payload.action == "cancel":
         membership.active = False
+        membership.cancelled = True
         db.commit()
+        invalidate_membership(membership.id)
         return {"message": "Membership cancelled"}
 
-    if not membership.active:
+    if membership.cancelled:
         raise HTTPException(status_code=400, detail="Cancelled membership cannot be extended")
 
-    membership.end_date = membership.end_date + timedelta(days=payload.extension_months * 30)
+    # A lapsed membership is renewed from today, not from its old end date.
+    renew_from = max(membership.end_date, date.today())
+    membership.end_date = renew_from + timedelta(days=payload.extension_months * 30)
     membership.membership_type = f"{payload.extension_months}_months"
+    membership.active = True
     db.commit()
+    invalidate_membership(membership.id)
     return {"message": "Membership extended successfully"}
 
 
+def _recompute_all_fines() -> list[dict]:
+    def recompute(db: Session, names: list[str]) -> dict:
+        return {"branches": ",".join(names), **recompute_pending_fines(db)}
+
+    return fan_out(recompute, read=False)
+
+
+@router.post("/recompute-fines")
+def recompute_fines(db: Session = Depends(get_tracked_db), admin: User = Depends(require_admin)):
+    """Queue a recompute over every partition; poll ``/reports/jobs/{job_id}``
+    and download the per-partition ``scanned``/``updated`` counts when done."""
+    job, how = submit_task_job(
+        db,
+        "recompute-fines",
+        ["branches", "scanned", "updated"],
+        _recompute_all_fines,
+        requested_by=admin.id,
+    )
+    return {"message": "Fine recompute queued", "job_id": job.id, "status": job.status, "submission": how}
+
+
+@router.post("/expire-memberships")
+def expire_memberships(db: Session = Depends(get_tracked_db), _: User = Depends(require_admin)):
+    expired = expire_lapsed_memberships(db)
+    return {"message": "Expiry sweep completed", "expired": expired}
+
+
 @router.get("/memberships")
-def list_memberships(db: Session = Depends(get_db), _: User = Depends(require_admin)):
+def list_memberships(db: Session = Depends(get_read_db), _: User = Depends(require_admin)):
     memberships = db.query(Membership).all()
     return [
         {
             "name": m.name,
             "membership_number": m.membership_number,
+            "branch": m.branch,
             "type": m.membership_type,
             "start_date": m.start_date,
             "end_date": m.end_date,
             "active": m.active,
+            "cancelled": m.cancelled,
         }
         for m in memberships
     ]
@@ -146,7 +249,7 @@ def list_memberships(db: Session = Depends(get_db), _: User = Depends(require_ad
 @router.post("/user-management")
 def user_management(
     payload: UserManageRequest,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_tracked_db),
     _: User = Depends(require_admin),
 ):
     membership_id = None
@@ -178,15 +281,18 @@ def user_management(
         db.add(user)
         db.commit()
         db.refresh(user)
+        invalidate_membership(membership_id)
         return {"message": "User created successfully", "user_id": user.id}
 
     if not existing:
         raise HTTPException(status_code=404, detail="Existing user not found")
 
+    previous_membership_id = existing.membership_id
     existing.name = payload.name.strip()
     existing.role = payload.role
     existing.membership_id = membership_id
     if payload.password:
         existing.password = hash_password(payload.password)
     db.commit()
+    invalidate_membership(previous_membership_id, membership_id)
     return {"message": "User updated successfully", "user_id": existing.id}
@@ -1,28 +1,48 @@
+import heapq
 from datetime import date
 from typing import Annotated, Optional
 from pathlib import Path
 import sys
 
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query as QueryParam, Request
+from fastapi.responses import FileResponse
+from sqlalchemy import Date, literal
+from sqlalchemy.orm import Query, Session
 
 try:
+    from app.auth import subject_from_authorization
+    from app.branches import fan_out, validate_branch
     from app.database import get_db
     from app.dependencies import require_user_or_admin
-    from app.models import Transaction, User
+    from app.fines import fine_policies
+    from app.models import Book, ReportJob, Title, Transaction, User
+    from app.profiling import ProfiledRoute
+    from app.report_jobs import JOB_DONE, ReportDefinition, submit_report_job
+    from app.schemas import ReportJobRequest
 except ImportError:
     if __package__ in (None, ""):
         sys.path.append(str(Path(__file__).resolve().parents[2]))
+        from app.auth import subject_from_authorization
+        from app.branches import fan_out, validate_branch
         from app.database import get_db
         from app.dependencies import require_user_or_admin
-        from app.models import Transaction, User
+        from app.fines import fine_policies
+        from app.models import Book, ReportJob, Title, Transaction, User
+        from app.profiling import ProfiledRoute
+        from app.report_jobs import JOB_DONE, ReportDefinition, submit_report_job
+        from app.schemas import ReportJobRequest
     else:
+        from ..auth import subject_from_authorization
+        from ..branches import fan_out, validate_branch
         from ..database import get_db
         from ..dependencies import require_user_or_admin
-        from ..models import Transaction, User
+        from ..fines import fine_policies
+        from ..models import Book, ReportJob, Title, Transaction, User
+        from ..profiling import ProfiledRoute
+        from ..report_jobs import JOB_DONE, ReportDefinition, submit_report_job
+        from ..schemas import ReportJobRequest
 
-router = APIRouter(prefix="/reports", tags=["Reports"])
-FINE_PER_DAY = 10
+router = APIRouter(prefix="/reports", tags=["Reports"], route_class=ProfiledRoute)
 
 
 def _issue_status(return_date: Optional[date]) -> str:
@@ -35,106 +55,258 @@ def _fine_status(calculated_fine: Optional[int], fine_paid: Optional[int]) -> st
     return "Fine Pending" if due_fine > paid_fine else "Clear"
 
 
+def _transactions(db: Session, branches: list[str]) -> Query:
+    return db.query(Transaction).filter(Transaction.branch.in_(branches))
+
+
+def _issued_query(db: Session, _: dict, branches: list[str]) -> Query:
+    return _transactions(db, branches).order_by(Transaction.id)
+
+
+def _issued_row(t: Transaction) -> dict:
+    return {
+        "branch": t.branch,
+        "transaction_id": t.id,
+        "user_id": t.user_id,
+        "book_id": t.book_id,
+        "issue_date": t.issue_date,
+        "due_date": t.due_date,
+        "status": _issue_status(t.return_date),
+    }
+
+
+def _returned_query(db: Session, _: dict, branches: list[str]) -> Query:
+    return _transactions(db, branches).filter(Transaction.return_date.is_not(None)).order_by(Transaction.id)
+
+
+def _returned_row(t: Transaction) -> dict:
+    return {
+        "branch": t.branch,
+        "transaction_id": t.id,
+        "user_id": t.user_id,
+        "book_id": t.book_id,
+        "issue_date": t.issue_date,
+        "return_date": t.return_date,
+        "fine_paid": t.fine_paid,
+        "status": "Returned",
+    }
+
+
+def _fine_query(db: Session, _: dict, branches: list[str]) -> Query:
+    return _transactions(db, branches).order_by(Transaction.id)
+
+
+def _fine_row(t: Transaction) -> dict:
+    return {
+        "branch": t.branch,
+        "transaction_id": t.id,
+        "user_id": t.user_id,
+        "book_id": t.book_id,
+        "due_date": t.due_date,
+        "return_date": t.return_date,
+        "fine": t.calculated_fine or 0,
+        "fine_paid": t.fine_paid or 0,
+        "status": _fine_status(t.calculated_fine, t.fine_paid),
+    }
+
+
+def _user_transactions_query(db: Session, params: dict, branches: list[str]) -> Query:
+    return _transactions(db, branches).filter(Transaction.user_id == params["user_id"]).order_by(Transaction.id)
+
+
+def _user_transaction_row(t: Transaction) -> dict:
+    return {
+        "branch": t.branch,
+        "transaction_id": t.id,
+        "book_id": t.book_id,
+        "issue_date": t.issue_date,
+        "due_date": t.due_date,
+        "return_date": t.return_date,
+        "status": _issue_status(t.return_date),
+    }
+
+
+def _overdue_query(db: Session, params: dict, branches: list[str]) -> Query:
+    # Jobs pin the date they were submitted for (see ReportDefinition.dated),
+    # so a job that runs past midnight matches its cache key.
+    as_of = date.fromisoformat(params["as_of"]) if "as_of" in params else date.today()
+    return (
+        db.query(Transaction, Title.media_type, literal(as_of, Date).label("as_of"))
+        .join(Book, Book.id == Transaction.book_id)
+        .join(Title, Title.id == Book.title_id)
+        .filter(
+            Transaction.branch.in_(branches),
+            Transaction.return_date.is_(None),
+            Transaction.due_date < as_of,
+        )
+        .order_by(Transaction.id)
+    )
+
+
+def _overdue_row(record) -> dict:
+    t, media_type, today = record
+    return {
+        "branch": t.branch,
+        "transaction_id": t.id,
+        "user_id": t.user_id,
+        "book_id": t.book_id,
+        "due_date": t.due_date,
+        "days_late": (today - t.due_date).days,
+        "fine": fine_policies().fine(media_type, t.due_date, today),
+    }
+
+
+REPORT_DEFINITIONS = {
+    "issued-books": ReportDefinition(
+        ["branch", "transaction_id", "user_id", "book_id", "issue_date", "due_date", "status"],
+        _issued_query,
+        _issued_row,
+    ),
+    "returned-books": ReportDefinition(
+        ["branch", "transaction_id", "user_id", "book_id", "issue_date", "return_date", "fine_paid", "status"],
+        _returned_query,
+        _returned_row,
+    ),
+    "fine-report": ReportDefinition(
+        ["branch", "transaction_id", "user_id", "book_id", "due_date", "return_date", "fine", "fine_paid", "status"],
+        _fine_query,
+        _fine_row,
+    ),
+    "user-transactions": ReportDefinition(
+        ["branch", "transaction_id", "book_id", "issue_date", "due_date", "return_date", "status"],
+        _user_transactions_query,
+        _user_transaction_row,
+    ),
+    "overdue-returns": ReportDefinition(
+        ["branch", "transaction_id", "user_id", "book_id", "due_date", "days_late", "fine"],
+        _overdue_query,
+        _overdue_row,
+        dated=True,
+    ),
+}
+
+
+def _collect(report: str, params: dict, branch: str | None, request: Request) -> list[dict]:
+    """Run a report on every partition holding ``branch`` (default: all) in
+    parallel and merge the per-partition results by transaction id."""
+    definition = REPORT_DEFINITIONS[report]
+    branches = [validate_branch(branch)] if branch else None
+
+    def run(db: Session, names: list[str]) -> list[dict]:
+        return [definition.row(record) for record in definition.query(db, params, names)]
+
+    subject = subject_from_authorization(request.headers.get("authorization"))
+    results = fan_out(run, branches, subject=subject)
+    return list(heapq.merge(*results, key=lambda row: (row["transaction_id"], row["branch"])))
+
+
 @router.get("/issued-books")
 def issued_books_report(
-    db: Annotated[Session, Depends(get_db)],
+    request: Request,
     _: Annotated[User, Depends(require_user_or_admin)],
+    branch: Annotated[str | None, QueryParam()] = None,
 ):
-    txns = db.query(Transaction).all()
-    return [
-        {
-            "transaction_id": t.id,
-            "user_id": t.user_id,
-            "book_id": t.book_id,
-            "issue_date": t.issue_date,
-            "due_date": t.due_date,
-            "status": _issue_status(t.return_date),
-        }
-        for t in txns
-    ]
+    return _collect("issued-books", {}, branch, request)
 
 
 @router.get("/returned-books")
 def returned_books_report(
-    db: Annotated[Session, Depends(get_db)],
+    request: Request,
     _: Annotated[User, Depends(require_user_or_admin)],
+    branch: Annotated[str | None, QueryParam()] = None,
 ):
-    txns = db.query(Transaction).filter(Transaction.return_date.is_not(None)).all()
-    return [
-        {
-            "transaction_id": t.id,
-            "user_id": t.user_id,
-            "book_id": t.book_id,
-            "issue_date": t.issue_date,
-            "return_date": t.return_date,
-            "fine_paid": t.fine_paid,
-            "status": "Returned",
-        }
-        for t in txns
-    ]
+    return _collect("returned-books", {}, branch, request)
 
 
 @router.get("/fine-report")
 def fine_report(
-    db: Annotated[Session, Depends(get_db)],
+    request: Request,
     _: Annotated[User, Depends(require_user_or_admin)],
+    branch: Annotated[str | None, QueryParam()] = None,
 ):
-    txns = db.query(Transaction).all()
-    return [
-        {
-            "transaction_id": t.id,
-            "user_id": t.user_id,
-            "book_id": t.book_id,
-            "due_date": t.due_date,
-            "return_date": t.return_date,
-            "fine": t.calculated_fine or 0,
-            "fine_paid": t.fine_paid or 0,
-            "status": _fine_status(t.calculated_fine, t.fine_paid),
-        }
-        for t in txns
-    ]
+    return _collect("fine-report", {}, branch, request)
 
 
 @router.get("/user-transactions/{user_id}")
 def user_transactions_report(
     user_id: int,
-    db: Annotated[Session, Depends(get_db)],
+    request: Request,
     _: Annotated[User, Depends(require_user_or_admin)],
+    branch: Annotated[str | None, QueryParam()] = None,
 ):
-    txns = db.query(Transaction).filter(Transaction.user_id == user_id).all()
-    return [
-        {
-            "transaction_id": t.id,
-            "book_id": t.book_id,
-            "issue_date": t.issue_date,
-            "due_date": t.due_date,
-            "return_date": t.return_date,
-            "status": _issue_status(t.return_date),
-        }
-        for t in txns
-    ]
+    return _collect("user-transactions", {"user_id": user_id}, branch, request)
 
 
 @router.get("/overdue-returns")
 def overdue_returns_report(
-    db: Annotated[Session, Depends(get_db)],
+    request: Request,
     _: Annotated[User, Depends(require_user_or_admin)],
+    branch: Annotated[str | None, QueryParam()] = None,
 ):
-    today = date.today()
-    txns = (
-        db.query(Transaction)
-        .filter(Transaction.return_date.is_(None), Transaction.due_date < today)
-        .all()
+    return _collect("overdue-returns", {}, branch, request)
+
+
+def _job_status(job: ReportJob) -> dict:
+    return {
+        "job_id": job.id,
+        "report": job.report_type,
+        "status": job.status,
+        "row_count": job.row_count,
+        "error": job.error,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+    }
+
+
+@router.post("/jobs")
+def submit_report(
+    payload: ReportJobRequest,
+    db: Annotated[Session, Depends(get_db)],
+    current_user: Annotated[User, Depends(require_user_or_admin)],
+):
+    params = {}
+    if payload.branch:
+        params["branch"] = validate_branch(payload.branch)
+    if payload.report == "user-transactions":
+        if payload.user_id is None:
+            raise HTTPException(status_code=400, detail="user_id is required for user-transactions")
+        params["user_id"] = payload.user_id
+
+    job, how = submit_report_job(
+        db,
+        payload.report,
+        REPORT_DEFINITIONS[payload.report],
+        params,
+        requested_by=current_user.id,
     )
-    return [
-        {
-            "transaction_id": t.id,
-            "user_id": t.user_id,
-            "book_id": t.book_id,
-            "due_date": t.due_date,
-            "days_late": (today - t.due_date).days,
-            "fine": (today - t.due_date).days * FINE_PER_DAY,
-        }
-        for t in txns
-    ]
+    return {**_job_status(job), "submission": how}
+
+
+@router.get("/jobs/{job_id}")
+def report_job_status(
+    job_id: str,
+    db: Annotated[Session, Depends(get_db)],
+    _: Annotated[User, Depends(require_user_or_admin)],
+):
+    job = db.get(ReportJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    return _job_status(job)
+
 
+@router.get("/jobs/{job_id}/download")
+def download_report_job(
+    job_id: str,
+    db: Annotated[Session, Depends(get_db)],
+    _: Annotated[User, Depends(require_user_or_admin)],
+):
+    job = db.get(ReportJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    if job.status != JOB_DONE or not job.result_path:
+        raise HTTPException(status_code=409, detail=f"Report job is {job.status}")
+    return FileResponse(
+        job.result_path,
+        media_type="text/csv",
+        filename=f"{job.report_type}-{job.id}.csv",
+    )
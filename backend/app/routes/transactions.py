@@ -1,89 +1,108 @@
 from datetime import date, timedelta
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
-from ..database import get_db
-from ..dependencies import require_user_or_admin
-from ..models import Book, Membership, Transaction, User
+from ..branches import POOL_DESK, current_branch, fan_out, get_branch_db, get_branch_read_db
+from ..dependencies import get_stream_user, get_tracked_db, require_user_or_admin
+from ..events import (
+    EVENT_ISSUED,
+    EVENT_RETURN_PENDING,
+    EVENT_RETURNED,
+    latest_sequence,
+    record_event,
+    sse_stream,
+)
+from ..fines import fine_policies
+from ..idempotency import IdempotentRoute
+from ..inventory import claim_copy, claim_specific_copy
+from ..memberships import membership_valid
+from ..models import Book, Title, Transaction, User
+from ..reservations import collect_hold, pass_on_copy, ready_hold_for
 from ..schemas import IssueBookRequest, PayFineRequest, ReturnBookRequest
 
-router = APIRouter(prefix="/transactions", tags=["Transactions"])
-FINE_PER_DAY = 10
+router = APIRouter(prefix="/transactions", tags=["Transactions"], route_class=IdempotentRoute)
+EVENT_SEQ_HEADER = "X-Event-Seq"
 
 
-def _has_unpaid_fine(db: Session, user_id: int) -> bool:
-    txn = (
-        db.query(Transaction)
-        .filter(
-            Transaction.user_id == user_id,
-            Transaction.calculated_fine > Transaction.fine_paid,
+def _has_unpaid_fine(user_id: int) -> bool:
+    # A fine owed at any branch blocks borrowing, so every partition is asked.
+    def owes(db: Session, _: list[str]) -> bool:
+        txn = (
+            db.query(Transaction.id)
+            .filter(
+                Transaction.user_id == user_id,
+                Transaction.calculated_fine > Transaction.fine_paid,
+            )
+            .first()
         )
-        .first()
-    )
-    return txn is not None
+        return txn is not None
+
+    return any(fan_out(owes, read=False, pool=POOL_DESK))
 
 
 def _has_active_membership(db: Session, user: User, on_date: date) -> bool:
-    if not user.membership_id:
-        return False
-    membership = db.query(Membership).filter(Membership.id == user.membership_id).first()
-    if not membership:
-        return False
-    return membership.active and membership.start_date <= on_date <= membership.end_date
+    return membership_valid(db, user.membership_id, on_date)
 
 
 @router.get("/book-available")
 def book_available(
     title: str | None = Query(default=None),
     media_type: str | None = Query(default=None),
-    db: Session = Depends(get_db),
+    branch: str = Depends(current_branch),
+    db: Session = Depends(get_branch_read_db),
     _: User = Depends(require_user_or_admin),
 ):
     if not title and not media_type:
         raise HTTPException(status_code=400, detail="Provide either title or media_type")
 
-    query = db.query(Book).filter(Book.available == True)
+    query = db.query(Title).filter(Title.branch == branch, Title.available_copies > 0)
     if title:
-        query = query.filter(Book.title.ilike(f"%{title.strip()}%"))
+        query = query.filter(Title.title.ilike(f"%{title.strip()}%"))
     if media_type:
-        query = query.filter(Book.media_type == media_type.strip().lower())
+        query = query.filter(Title.media_type == media_type.strip().lower())
 
-    books = query.all()
+    titles = query.all()
     return [
         {
-            "id": b.id,
-            "title": b.title,
-            "author": b.author,
-            "serial_no": b.serial_no,
-            "media_type": b.media_type,
-            "available": b.available,
+            "id": t.id,
+            "title_id": t.id,
+            "branch": t.branch,
+            "title": t.title,
+            "author": t.author,
+            "media_type": t.media_type,
+            "category": t.category,
+            "total_copies": t.total_copies,
+            "available_copies": t.available_copies,
+            "available": t.available_copies > 0,
         }
-        for b in books
+        for t in titles
     ]
 
 
 @router.post("/issue-book")
 def issue_book(
     payload: IssueBookRequest,
-    db: Session = Depends(get_db),
+    branch: str = Depends(current_branch),
+    db: Session = Depends(get_tracked_db),
+    branch_db: Session = Depends(get_branch_db),
     _: User = Depends(require_user_or_admin),
 ):
+    if payload.title_id is None and payload.book_id is None:
+        raise HTTPException(status_code=400, detail="Provide either title_id or book_id")
+
     user = db.query(User).filter(User.id == payload.user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    book = db.query(Book).filter(Book.id == payload.book_id, Book.available == True).first()
-    if not book:
-        raise HTTPException(status_code=400, detail="Book not available")
-
     if payload.issue_date < date.today():
         raise HTTPException(status_code=400, detail="Issue date cannot be lesser than today")
 
     if not _has_active_membership(db, user, payload.issue_date):
         raise HTTPException(status_code=400, detail="Active membership required")
 
-    if _has_unpaid_fine(db, payload.user_id):
+    if _has_unpaid_fine(payload.user_id):
         raise HTTPException(status_code=400, detail="User has unpaid fine")
 
     max_return_date = payload.issue_date + timedelta(days=15)
@@ -94,22 +113,53 @@ def issue_book(
     if due_date < payload.issue_date:
         raise HTTPException(status_code=400, detail="Return date cannot be before issue date")
 
+    hold = ready_hold_for(branch_db, user.id, title_id=payload.title_id, book_id=payload.book_id)
+    if hold and hold.book.branch == branch:
+        # The copy was set aside for this member when it came back.
+        if not collect_hold(branch_db, hold):
+            branch_db.rollback()
+            raise HTTPException(status_code=409, detail="The copy held for this user is no longer reserved")
+        book = hold.book
+    elif payload.book_id is not None:
+        book = branch_db.query(Book).filter(Book.id == payload.book_id, Book.branch == branch).first()
+        if not book or not claim_specific_copy(branch_db, book):
+            branch_db.rollback()
+            raise HTTPException(status_code=400, detail="Book not available")
+    else:
+        book = claim_copy(branch_db, payload.title_id, branch)
+        if not book:
+            branch_db.rollback()
+            raise HTTPException(status_code=400, detail="Book not available")
+
     txn = Transaction(
+        branch=branch,
         book_id=book.id,
         user_id=payload.user_id,
         issue_date=payload.issue_date,
         due_date=due_date,
         remarks=payload.remarks,
     )
-    book.available = False
-    db.add(txn)
-    db.commit()
-    db.refresh(txn)
+    branch_db.add(txn)
+    branch_db.flush()
+    record_event(
+        branch_db,
+        EVENT_ISSUED,
+        transaction_id=txn.id,
+        book_id=book.id,
+        user_id=txn.user_id,
+        issue_date=txn.issue_date,
+        due_date=txn.due_date,
+    )
+    branch_db.commit()
+    branch_db.refresh(txn)
     return {
         "message": "Book issued successfully",
+        "branch": branch,
         "transaction_id": txn.id,
-        "book_name": book.title,
-        "author": book.author,
+        "book_id": book.id,
+        "serial_no": book.serial_no,
+        "book_name": book.title_record.title,
+        "author": book.title_record.author,
         "issue_date": txn.issue_date,
         "return_date": txn.due_date,
     }
@@ -118,12 +168,17 @@ def issue_book(
 @router.post("/return-book")
 def return_book(
     payload: ReturnBookRequest,
-    db: Session = Depends(get_db),
+    branch: str = Depends(current_branch),
+    db: Session = Depends(get_branch_db),
     _: User = Depends(require_user_or_admin),
 ):
     txn = (
         db.query(Transaction)
-        .filter(Transaction.id == payload.transaction_id, Transaction.return_date == None)
+        .filter(
+            Transaction.id == payload.transaction_id,
+            Transaction.branch == branch,
+            Transaction.return_date == None,
+        )
         .first()
     )
     if not txn:
@@ -136,15 +191,22 @@ def return_book(
         raise HTTPException(status_code=400, detail="Serial number mismatch")
 
     txn.pending_return_date = payload.return_date
-    days_late = max((payload.return_date - txn.due_date).days, 0)
-    fine = days_late * FINE_PER_DAY
+    fine = fine_policies().fine(book.title_record.media_type, txn.due_date, payload.return_date)
     txn.calculated_fine = fine
+    record_event(
+        db,
+        EVENT_RETURN_PENDING,
+        transaction_id=txn.id,
+        book_id=book.id,
+        pending_return_date=payload.return_date,
+        fine=fine,
+    )
     db.commit()
     return {
         "message": "Proceed to pay fine page",
         "transaction_id": txn.id,
-        "book_name": book.title,
-        "author": book.author,
+        "book_name": book.title_record.title,
+        "author": book.title_record.author,
         "issue_date": txn.issue_date,
         "return_date": txn.due_date,
         "selected_return_date": payload.return_date,
@@ -155,12 +217,17 @@ def return_book(
 @router.post("/pay-fine")
 def pay_fine(
     payload: PayFineRequest,
-    db: Session = Depends(get_db),
+    branch: str = Depends(current_branch),
+    db: Session = Depends(get_branch_db),
     _: User = Depends(require_user_or_admin),
 ):
     txn = (
         db.query(Transaction)
-        .filter(Transaction.id == payload.transaction_id, Transaction.return_date == None)
+        .filter(
+            Transaction.id == payload.transaction_id,
+            Transaction.branch == branch,
+            Transaction.return_date == None,
+        )
         .first()
     )
     if not txn:
@@ -176,19 +243,46 @@ def pay_fine(
         txn.remarks = payload.remarks
 
     book = db.query(Book).filter(Book.id == txn.book_id).first()
-    if book:
-        book.available = True
+    hold = pass_on_copy(db, book) if book else None
+    record_event(
+        db,
+        EVENT_RETURNED,
+        transaction_id=txn.id,
+        book_id=txn.book_id,
+        user_id=txn.user_id,
+        return_date=txn.return_date,
+        fine_paid=txn.fine_paid,
+    )
 
     db.commit()
-    return {"message": "Book returned successfully"}
+    response = {"message": "Book returned successfully"}
+    if hold:
+        response["hold_id"] = hold.id
+        response["held_for_user_id"] = hold.user_id
+    return response
 
 
 @router.get("/overdue-returns")
-def overdue_returns(db: Session = Depends(get_db), _: User = Depends(require_user_or_admin)):
+def overdue_returns(
+    response: Response,
+    branch: str = Depends(current_branch),
+    db: Session = Depends(get_branch_read_db),
+    _: User = Depends(require_user_or_admin),
+):
+    # Read the feed position first so a client resuming from it cannot miss
+    # a change that lands while the list is being built.
+    response.headers[EVENT_SEQ_HEADER] = str(latest_sequence(db))
     today = date.today()
-    txns = (
-        db.query(Transaction)
-        .filter(Transaction.return_date == None, Transaction.due_date < today)
+    policies = fine_policies()
+    rows = (
+        db.query(Transaction, Title.media_type)
+        .join(Book, Book.id == Transaction.book_id)
+        .join(Title, Title.id == Book.title_id)
+        .filter(
+            Transaction.branch == branch,
+            Transaction.return_date == None,
+            Transaction.due_date < today,
+        )
         .all()
     )
     return [
@@ -198,15 +292,21 @@ def overdue_returns(db: Session = Depends(get_db), _: User = Depends(require_use
             "user_id": t.user_id,
             "due_date": t.due_date,
             "days_late": (today - t.due_date).days,
-            "fine": (today - t.due_date).days * FINE_PER_DAY,
+            "fine": policies.fine(media_type, t.due_date, today),
         }
-        for t in txns
+        for t, media_type in rows
     ]
 
 
 @router.get("/active-issues")
-def active_issues(db: Session = Depends(get_db), _: User = Depends(require_user_or_admin)):
-    txns = db.query(Transaction).filter(Transaction.return_date == None).all()
+def active_issues(
+    response: Response,
+    branch: str = Depends(current_branch),
+    db: Session = Depends(get_branch_read_db),
+    _: User = Depends(require_user_or_admin),
+):
+    response.headers[EVENT_SEQ_HEADER] = str(latest_sequence(db))
+    txns = db.query(Transaction).filter(Transaction.branch == branch, Transaction.return_date == None).all()
     return [
         {
             "transaction_id": t.id,
@@ -217,3 +317,21 @@ def active_issues(db: Session = Depends(get_db), _: User = Depends(require_user_
         }
         for t in txns
     ]
+
+
+@router.get("/events")
+def circulation_events(
+    after: int | None = Query(default=None, ge=0),
+    last_event_id: str | None = Header(default=None),
+    branch: str = Depends(current_branch),
+    _: User = Depends(get_stream_user),
+):
+    # EventSource reconnects with Last-Event-ID; prefer it over the original ?after.
+    start = after or 0
+    if last_event_id and last_event_id.isdigit():
+        start = int(last_event_id)
+    return StreamingResponse(
+        sse_stream(start, branch),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -2,10 +2,12 @@ from fastapi import APIRouter, Depends
 
 from ..dependencies import require_user_or_admin
 from ..models import User
+from ..profiling import ProfiledRoute
 
 router = APIRouter(
     prefix="/user",
-    tags=["User"]
+    tags=["User"],
+    route_class=ProfiledRoute,
 )
 
 @router.get("/home")
@@ -13,6 +13,7 @@ class LoginResponse(BaseModel):
     role: str
     access_token: str
     token_type: str = "bearer"
+    branches: list[str] = []  # served by this deployment; the first is the default
 
 
 class BookCreateRequest(BaseModel):
@@ -60,7 +61,8 @@ class BookAvailabilityQuery(BaseModel):
 
 class IssueBookRequest(BaseModel):
     user_id: int
-    book_id: int
+    title_id: int | None = None
+    book_id: int | None = None
     issue_date: date
     return_date: date | None = None
     remarks: str | None = None
@@ -76,3 +78,31 @@ class PayFineRequest(BaseModel):
     transaction_id: int
     fine_paid: bool = Field(default=False)
     remarks: str | None = None
+
+
+class HoldPlaceRequest(BaseModel):
+    user_id: int
+    title_id: int
+
+
+class HoldCancelRequest(BaseModel):
+    hold_id: int
+
+
+class ReportJobRequest(BaseModel):
+    report: Literal[
+        "issued-books",
+        "returned-books",
+        "fine-report",
+        "user-transactions",
+        "overdue-returns",
+    ]
+    user_id: int | None = None
+    branch: str | None = None
+
+
+class ProfilingRequest(BaseModel):
+    routes: list[str] = []  # route templates, e.g. "/reports/user-transactions/{user_id}"
+    sample_percent: float = Field(default=0, ge=0, le=100)
+    duration_seconds: int = Field(default=300, gt=0, le=3600)
+    explain: bool = True
@@ -0,0 +1,45 @@
+"""Collision-free number allocation backed by the ``sequences`` table.
+
+``allocate`` reserves a contiguous block with one atomic UPDATE, so bulk
+imports take thousands of numbers in a single round trip and concurrent
+callers can never receive the same value.
+"""
+from datetime import date
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .models import Sequence
+
+MEMBERSHIP_SEQUENCE = "membership_number"
+
+
+def allocate(db: Session, name: str, count: int = 1) -> range:
+    """Reserve ``count`` values from sequence ``name`` in the caller's transaction."""
+    bumped = db.execute(
+        update(Sequence)
+        .where(Sequence.name == name)
+        .values(next_value=Sequence.next_value + count)
+        .execution_options(synchronize_session=False)
+    )
+    if bumped.rowcount == 0:
+        _create(db, name)
+        return allocate(db, name, count)
+
+    # The UPDATE holds the row lock until commit, so this read is ours alone.
+    end = db.query(Sequence.next_value).filter(Sequence.name == name).scalar()
+    return range(end - count, end)
+
+
+def _create(db: Session, name: str) -> None:
+    try:
+        with db.begin_nested():
+            db.add(Sequence(name=name, next_value=1))
+    except IntegrityError:
+        pass  # created concurrently
+
+
+def membership_numbers(db: Session, count: int = 1, on_date: date | None = None) -> list[str]:
+    prefix = f"M-{(on_date or date.today()).strftime('%Y%m%d')}"
+    return [f"{prefix}-{value:06d}" for value in allocate(db, MEMBERSHIP_SEQUENCE, count)]
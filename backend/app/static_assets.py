@@ -0,0 +1,180 @@
+"""Serve the ``frontend/`` directory from the API process under ``/app``.
+
+The directory is read once.  Stylesheets and scripts are published under a
+content-hashed name (``css/style.3f9a0c1b2d.css``) and HTML pages are
+rewritten to reference those names, so the hashed files can be cached for a
+year while pages are always revalidated by ETag and pick up a deploy on the
+next load.  Every text file is precompressed at the highest level with gzip
+and, when the ``brotli`` package is installed, brotli; each request gets the
+smallest encoding the client accepts.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from fastapi import APIRouter, HTTPException, Request, Response
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+FRONTEND_DIR = os.getenv("FRONTEND_DIR", str(Path(__file__).resolve().parents[2] / "frontend"))
+STATIC_PREFIX = "/app"
+INDEX_PAGE = "login.html"
+
+CACHE_IMMUTABLE = "public, max-age=31536000, immutable"
+CACHE_REVALIDATE = "no-cache"
+
+HASHED_SUFFIXES = {".css", ".js"}
+COMPRESSIBLE_SUFFIXES = {".html", ".css", ".js", ".json", ".svg", ".txt"}
+
+# Local href/src attributes pointing at a stylesheet or script.
+_ASSET_REF = re.compile(rb'\b(href|src)="([^":?#]+\.(?:css|js))"')
+
+
+@dataclass(frozen=True)
+class Asset:
+    body: bytes
+    media_type: str
+    etag: str
+    cache_control: str
+    encodings: dict[str, bytes] = field(default_factory=dict)  # content-encoding -> body
+
+
+def _precompress(body: bytes) -> dict[str, bytes]:
+    encodings = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        encodings["br"] = brotli.compress(body, quality=11)
+    # A tiny file can grow when compressed; only keep variants that help.
+    return {name: data for name, data in encodings.items() if len(data) < len(body)}
+
+
+def _hashed_name(path: str, body: bytes) -> str:
+    stem, suffix = posixpath.splitext(path)
+    return f"{stem}.{hashlib.sha256(body).hexdigest()[:10]}{suffix}"
+
+
+def _rewrite_refs(page: str, body: bytes, hashed: dict[str, str]) -> bytes:
+    base = posixpath.dirname(page)
+
+    def replace(match: re.Match) -> bytes:
+        target = posixpath.normpath(posixpath.join(base, match.group(2).decode()))
+        if target not in hashed:
+            return match.group(0)
+        new_ref = posixpath.relpath(hashed[target], base or ".")
+        return match.group(1) + b'="' + new_ref.encode() + b'"'
+
+    return _ASSET_REF.sub(replace, body)
+
+
+def _asset(path: str, body: bytes, cache_control: str) -> Asset:
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    if media_type.startswith("text/") or media_type == "application/javascript":
+        media_type += "; charset=utf-8"
+    suffix = posixpath.splitext(path)[1]
+    return Asset(
+        body=body,
+        media_type=media_type,
+        # Weak: the same tag covers every content-encoding of the file.
+        etag=f'W/"{hashlib.sha256(body).hexdigest()[:16]}"',
+        cache_control=cache_control,
+        encodings=_precompress(body) if suffix in COMPRESSIBLE_SUFFIXES else {},
+    )
+
+
+def build_assets(root: str) -> dict[str, Asset]:
+    """Load, fingerprint and precompress every file under ``root``."""
+    files = {
+        path.relative_to(root).as_posix(): path.read_bytes()
+        for path in sorted(Path(root).rglob("*"))
+        if path.is_file()
+    }
+    hashed = {
+        path: _hashed_name(path, body)
+        for path, body in files.items()
+        if posixpath.splitext(path)[1] in HASHED_SUFFIXES
+    }
+
+    assets = {}
+    for path, body in files.items():
+        if path.endswith(".html"):
+            body = _rewrite_refs(path, body, hashed)
+        # The plain name stays reachable (revalidated) for anything that
+        # still links to it directly.
+        assets[path] = _asset(path, body, CACHE_REVALIDATE)
+        if path in hashed:
+            assets[hashed[path]] = _asset(path, body, CACHE_IMMUTABLE)
+    return assets
+
+
+_assets: dict[str, Asset] | None = None
+
+
+def frontend_assets() -> dict[str, Asset]:
+    global _assets
+    if _assets is None:
+        _assets = build_assets(FRONTEND_DIR) if os.path.isdir(FRONTEND_DIR) else {}
+    return _assets
+
+
+def _weights(header: str) -> dict[str, float]:
+    """Map each coding in ``Accept-Encoding`` to its q-value (default 1)."""
+    weights = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name] = q
+    return weights
+
+
+def _choose_encoding(header: str, asset: Asset) -> str | None:
+    weights = _weights(header)
+    # A coding named explicitly wins over "*", so "gzip;q=0, *" still refuses gzip.
+    candidates = [
+        (len(body), name)
+        for name, body in asset.encodings.items()
+        if weights.get(name, weights.get("*", 0)) > 0
+    ]
+    return min(candidates)[1] if candidates else None
+
+
+router = APIRouter(prefix=STATIC_PREFIX, include_in_schema=False)
+
+
+@router.get("/{path:path}")
+def frontend_file(path: str, request: Request) -> Response:
+    asset = frontend_assets().get(path or INDEX_PAGE)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Not found")
+
+    headers = {"Cache-Control": asset.cache_control, "ETag": asset.etag}
+    if asset.encodings:
+        headers["Vary"] = "Accept-Encoding"
+    if_none_match = request.headers.get("if-none-match", "")
+    if asset.etag in (tag.strip() for tag in if_none_match.split(",")) or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+
+    encoding = _choose_encoding(request.headers.get("accept-encoding", ""), asset)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(
+        asset.encodings[encoding] if encoding else asset.body,
+        media_type=asset.media_type,
+        headers=headers,
+    )
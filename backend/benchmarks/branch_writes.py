@@ -0,0 +1,161 @@
+"""Benchmark circulation write throughput as branches are added.
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.branch_writes --branches 1 2 4 8 --ops 300
+
+For each branch count, one writer process per branch issues and returns
+books as fast as it can, first with every branch sharing one SQLite file
+and then with each branch on its own partition (``BRANCH_DATABASE_URLS``).
+Prints committed writes per second for both layouts.
+
+Writers are separate processes, so scaling needs one core per branch.  On
+storage where a commit is not almost free, ``--commit-latency-ms`` holds
+the write lock for that long before each commit to emulate it.
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from datetime import date, timedelta
+
+COPIES_PER_BRANCH = 50
+
+
+def _configure(workdir: str, branches: list[str], partitioned: bool) -> None:
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'library.db')}"
+    os.environ["LIBRARY_BRANCHES"] = ",".join(branches)
+    os.environ["BRANCH_DATABASE_URLS"] = ",".join(
+        f"{b}=sqlite:///{os.path.join(workdir, f'library_{b}.db')}" for b in branches
+    ) if partitioned else ""
+
+
+def _seed(workdir: str, branches: list[str], partitioned: bool) -> None:
+    _configure(workdir, branches, partitioned)
+    # Imported late so the engines pick up the benchmark configuration.
+    from sqlalchemy import insert
+
+    from app.branches import create_partitions
+    from app.database import SessionLocal, partition_session, partition_url
+    from app.models import Book, Membership, Title, User
+
+    create_partitions()
+    db = SessionLocal()
+    today = date.today()
+    db.add(Membership(membership_number="BENCH-1", name="Bench", membership_type="6_months",
+                      start_date=today, end_date=today + timedelta(days=180), active=True))
+    db.flush()
+    db.add(User(name="Desk", username="desk", password="x", role="admin", membership_id=1))
+    db.commit()
+    db.close()
+
+    for branch in branches:
+        db = partition_session(partition_url(branch))
+        title = Title(branch=branch, title="Bench", author="Bench", media_type="book",
+                      category="general", total_copies=COPIES_PER_BRANCH, available_copies=COPIES_PER_BRANCH)
+        db.add(title)
+        db.flush()
+        db.execute(
+            insert(Book),
+            [{"branch": branch, "title_id": title.id, "serial_no": f"{branch}-{i}", "available": True}
+             for i in range(COPIES_PER_BRANCH)],
+        )
+        db.commit()
+        db.close()
+
+
+def _writer(
+    workdir: str,
+    branches: list[str],
+    partitioned: bool,
+    branch: str,
+    ops: int,
+    latency: float,
+    start_at: float,
+) -> tuple[int, int]:
+    _configure(workdir, branches, partitioned)
+    from sqlalchemy.exc import OperationalError
+
+    from app.database import partition_session, partition_url
+    from app.events import EVENT_ISSUED, EVENT_RETURNED, record_event
+    from app.inventory import claim_copy, release_copy
+    from app.models import Title, Transaction
+
+    db = partition_session(partition_url(branch))
+    db.info["branch"] = branch
+    title_id = db.query(Title.id).filter(Title.branch == branch).scalar()
+    today = date.today()
+    committed = failed = 0
+
+    time.sleep(max(0.0, start_at - time.time()))
+    for _ in range(ops):
+        try:
+            book = claim_copy(db, title_id, branch)
+            txn = Transaction(branch=branch, book_id=book.id, user_id=1, issue_date=today,
+                              due_date=today + timedelta(days=15))
+            db.add(txn)
+            db.flush()
+            record_event(db, EVENT_ISSUED, transaction_id=txn.id, book_id=book.id)
+            db.flush()
+            time.sleep(latency)
+            db.commit()
+
+            txn.return_date = today
+            release_copy(db, book)
+            record_event(db, EVENT_RETURNED, transaction_id=txn.id, book_id=book.id)
+            db.flush()
+            time.sleep(latency)
+            db.commit()
+            committed += 2
+        except OperationalError:
+            # "database is locked" once the busy timeout runs out.
+            db.rollback()
+            failed += 1
+    db.close()
+    return committed, failed
+
+
+def _run(branch_count: int, partitioned: bool, ops: int, latency: float) -> tuple[float, int]:
+    branches = [f"branch{i}" for i in range(1, branch_count + 1)]
+    workdir = tempfile.mkdtemp(prefix="lms-branches-")
+    ctx = multiprocessing.get_context("spawn")
+    try:
+        seeder = ctx.Process(target=_seed, args=(workdir, branches, partitioned))
+        seeder.start()
+        seeder.join()
+
+        with ctx.Pool(branch_count) as pool:
+            start_at = time.time() + 2.0  # let every worker finish importing
+            results = pool.starmap(
+                _writer,
+                [(workdir, branches, partitioned, b, ops, latency, start_at) for b in branches],
+            )
+            elapsed = time.time() - start_at
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    committed = sum(c for c, _ in results)
+    failed = sum(f for _, f in results)
+    return committed / elapsed, failed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--branches", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--ops", type=int, default=300, help="issue/return cycles per branch")
+    parser.add_argument("--commit-latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    latency = args.commit_latency_ms / 1000
+
+    print(f"{'branches':>8}  {'shared file':>14}  {'partitioned':>14}  {'speed-up':>8}")
+    for count in args.branches:
+        shared, shared_failed = _run(count, partitioned=False, ops=args.ops, latency=latency)
+        split, split_failed = _run(count, partitioned=True, ops=args.ops, latency=latency)
+        note = f"  ({shared_failed} / {split_failed} locked out)" if shared_failed or split_failed else ""
+        print(f"{count:>8}  {shared:>10.0f} w/s  {split:>10.0f} w/s  {split / shared:>7.2f}x{note}")
+
+
+if __name__ == "__main__":
+    main()
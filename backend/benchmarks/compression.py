@@ -0,0 +1,129 @@
+"""Benchmark bytes on the wire and latency of compressed API and frontend responses.
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.compression --history 20000 --levels 1 6 9 --link-kbps 2000
+
+Seeds a throwaway SQLite database, then fetches ``/reports/fine-report``
+uncompressed and at each gzip level (``API_COMPRESSION_LEVEL``), each level
+in a fresh process.  Latency is the in-process response time plus the time
+the payload would take over a link of ``--link-kbps``, which is what a
+branch on a VPN sees.  Also prints the size of the frontend as served raw,
+gzip and brotli.
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+
+def _configure(workdir: str, level: int) -> None:
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["API_COMPRESSION_LEVEL"] = str(level)
+    os.environ["RATE_LIMIT_REPORT_PER_MINUTE"] = "0"
+
+
+def _seed(workdir: str, history: int) -> None:
+    _configure(workdir, 6)
+    # Imported late so the engine picks up the benchmark DATABASE_URL.
+    from sqlalchemy import insert
+
+    from app.database import SessionLocal
+    from app.main import app  # noqa: F401  (creates the schema)
+    from app.models import Book, Title, Transaction, User
+
+    db = SessionLocal()
+    today = date.today()
+    db.add(User(name="Analyst", username="analyst", password="x", role="admin"))
+    db.add(Title(title="Bench", author="Bench", media_type="book", total_copies=1, available_copies=1))
+    db.flush()
+    db.execute(insert(Book), [{"title_id": 1, "serial_no": "B-1", "available": True}])
+    db.execute(
+        insert(Transaction),
+        [
+            {"user_id": 1, "book_id": 1, "issue_date": today - timedelta(days=30 + i % 300),
+             "due_date": today - timedelta(days=15 + i % 300), "return_date": today - timedelta(days=i % 300),
+             "calculated_fine": (i % 7) * 10, "fine_paid": (i % 5) * 10}
+            for i in range(history)
+        ],
+    )
+    db.commit()
+    db.close()
+
+
+def _measure(workdir: str, level: int, requests: int) -> tuple[int, list[float]]:
+    """Return (bytes on the wire, response times in ms); level 0 means uncompressed."""
+    _configure(workdir, max(level, 1))
+    from fastapi.testclient import TestClient
+
+    from app.auth import create_access_token
+    from app.main import app
+
+    headers = {
+        "Authorization": "Bearer " + create_access_token({"sub": "1", "role": "admin"}),
+        "Accept-Encoding": "gzip" if level else "identity",
+    }
+    timings = []
+    wire_bytes = 0
+    with TestClient(app) as client:
+        client.get("/reports/fine-report", headers=headers)  # warm up
+        for _ in range(requests):
+            started = time.perf_counter()
+            with client.stream("GET", "/reports/fine-report", headers=headers) as res:
+                res.read()
+                wire_bytes = res.num_bytes_downloaded
+            timings.append((time.perf_counter() - started) * 1000)
+    return wire_bytes, timings
+
+
+def _frontend_sizes() -> tuple[int, int, int]:
+    from app.static_assets import CACHE_IMMUTABLE, FRONTEND_DIR, build_assets
+
+    assets = build_assets(FRONTEND_DIR)
+    # One copy of every file as a browser would fetch it: pages plus hashed assets.
+    served = [a for path, a in assets.items() if path.endswith(".html") or a.cache_control == CACHE_IMMUTABLE]
+    raw = sum(len(a.body) for a in served)
+    gz = sum(len(a.encodings.get("gzip", a.body)) for a in served)
+    br = sum(len(a.encodings.get("br", a.encodings.get("gzip", a.body))) for a in served)
+    return raw, gz, br
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--history", type=int, default=20_000)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 6, 9])
+    parser.add_argument("--requests", type=int, default=5)
+    parser.add_argument("--link-kbps", type=float, default=2_000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="lms-bench-")
+    ctx = multiprocessing.get_context("spawn")
+    try:
+        seeder = ctx.Process(target=_seed, args=(workdir, args.history))
+        seeder.start()
+        seeder.join()
+        with ctx.Pool(1, maxtasksperchild=1) as pool:
+            results = [(level, pool.apply(_measure, (workdir, level, args.requests))) for level in [0, *args.levels]]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"fine-report, {args.history} rows, {args.link_kbps:.0f} kbit/s link")
+    print(f"{'encoding':>10}  {'bytes':>10}  {'ratio':>6}  {'server p50':>10}  {'over link':>10}")
+    baseline = results[0][1][0]
+    for level, (wire_bytes, timings) in results:
+        server = statistics.median(timings)
+        transfer = wire_bytes * 8 / (args.link_kbps * 1000) * 1000
+        name = f"gzip -{level}" if level else "identity"
+        print(f"{name:>10}  {wire_bytes:>10,}  {baseline / wire_bytes:>5.1f}x  "
+              f"{server:>8.0f}ms  {server + transfer:>8.0f}ms")
+
+    raw, gz, br = _frontend_sizes()
+    print(f"frontend: {raw:,} bytes raw, {gz:,} gzip, {br:,} brotli (cached for a year once hashed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Benchmark next-in-line hold assignment with a large outstanding queue.
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.holds_benchmark --holds 100000 --titles 500 --returns 2000
+
+Builds a throwaway SQLite database, fills it with waiting holds and times
+how long it takes to hand returned copies to the head of each queue.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--holds", type=int, default=100_000)
+    parser.add_argument("--titles", type=int, default=500)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--returns", type=int, default=2_000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="lms-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+
+    # Imported late so the engine picks up the benchmark DATABASE_URL.
+    from sqlalchemy import insert
+
+    from app.database import Base, SessionLocal, engine
+    from app.models import Book, Hold, Title, User
+    from app.reservations import assign_to_next_hold
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    now = datetime.now()
+
+    db.execute(
+        insert(Title),
+        [
+            {"title": f"Title {i}", "author": "Bench", "media_type": "book",
+             "category": "general", "total_copies": 1, "available_copies": 0}
+            for i in range(1, args.titles + 1)
+        ],
+    )
+    db.execute(
+        insert(Book),
+        [{"title_id": i, "serial_no": f"B-{i}", "available": False}
+         for i in range(1, args.titles + 1)],
+    )
+    db.execute(
+        insert(User),
+        [{"username": f"u{i}", "name": f"U{i}", "password": "x", "role": "user"}
+         for i in range(1, args.users + 1)],
+    )
+    db.execute(
+        insert(Hold),
+        [
+            {"title_id": random.randint(1, args.titles),
+             "user_id": random.randint(1, args.users),
+             "status": "waiting", "placed_at": now}
+            for _ in range(args.holds)
+        ],
+    )
+    db.commit()
+
+    books = db.query(Book).all()
+    started = time.perf_counter()
+    assigned = 0
+    for i in range(args.returns):
+        book = books[i % len(books)]
+        if assign_to_next_hold(db, book):
+            assigned += 1
+        db.commit()
+    elapsed = time.perf_counter() - started
+    db.close()
+
+    print(f"outstanding holds : {args.holds}")
+    print(f"returns processed : {args.returns} ({assigned} assigned)")
+    print(f"total             : {elapsed:.3f}s")
+    print(f"per return        : {elapsed / args.returns * 1000:.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
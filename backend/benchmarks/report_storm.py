@@ -0,0 +1,154 @@
+"""Load test: desk latency while analysts hammer ``/reports/fine-report``.
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.report_storm                      # admission control on
+    python -m benchmarks.report_storm --no-admission       # baseline
+
+Seeds a throwaway SQLite database with a large transaction history, then
+runs a storm of concurrent full fine reports while a desk client issues
+books one after another, and prints the desk latency distribution along
+with how many report calls were admitted or turned away with 429.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def _run(args) -> None:
+    import httpx
+    from sqlalchemy import insert
+
+    from app.auth import create_access_token
+    from app.database import SessionLocal
+    from app.main import app
+    from app.models import Book, Membership, Title, Transaction, User
+
+    db = SessionLocal()
+    today = date.today()
+    membership = Membership(
+        membership_number="BENCH-1",
+        name="Bench",
+        membership_type="6_months",
+        start_date=today,
+        end_date=today + timedelta(days=180),
+        active=True,
+    )
+    db.add(membership)
+    db.flush()
+    desk_user = User(name="Desk", username="desk", password="x", role="admin", membership_id=membership.id)
+    db.add(desk_user)
+    db.add_all(
+        [User(name=f"Analyst {i}", username=f"analyst{i}", password="x", role="user") for i in range(args.analysts)]
+    )
+    db.execute(
+        insert(Title),
+        [
+            {"title": f"Title {i}", "author": "Bench", "media_type": "book",
+             "category": "general", "total_copies": 1, "available_copies": 1}
+            for i in range(1, args.desk_ops + 2)
+        ],
+    )
+    db.execute(
+        insert(Book),
+        [{"title_id": i, "serial_no": f"B-{i}", "available": True} for i in range(1, args.desk_ops + 2)],
+    )
+    db.commit()
+    db.execute(
+        insert(Transaction),
+        [
+            {"user_id": desk_user.id, "book_id": 1, "issue_date": today - timedelta(days=30),
+             "due_date": today - timedelta(days=15), "return_date": today - timedelta(days=10),
+             "calculated_fine": 50, "fine_paid": 50}
+            for _ in range(args.history)
+        ],
+    )
+    db.commit()
+    analyst_ids = [u.id for u in db.query(User).filter(User.username.like("analyst%")).all()]
+    desk_token = create_access_token({"sub": str(desk_user.id), "role": "admin"})
+    desk_id = desk_user.id
+    db.close()
+
+    transport = httpx.ASGITransport(app=app)
+    outcomes = {"admitted": 0, "rejected": 0, "desk_failed": 0}
+    stop = asyncio.Event()
+
+    async def analyst(user_id: int) -> None:
+        headers = {"Authorization": "Bearer " + create_access_token({"sub": str(user_id), "role": "user"})}
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            while not stop.is_set():
+                res = await client.get("/reports/fine-report", headers=headers)
+                if res.status_code == 429:
+                    outcomes["rejected"] += 1
+                    await asyncio.sleep(float(res.headers.get("retry-after", "1")))
+                else:
+                    outcomes["admitted"] += 1
+
+    async def desk() -> list[float]:
+        headers = {"Authorization": f"Bearer {desk_token}"}
+        latencies = []
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for title_id in range(2, args.desk_ops + 2):
+                started = time.perf_counter()
+                try:
+                    res = await client.post(
+                        "/transactions/issue-book",
+                        headers=headers,
+                        json={"user_id": desk_id, "title_id": title_id, "issue_date": str(today)},
+                    )
+                    failed = res.status_code != 200
+                except Exception:
+                    # e.g. connection pool exhausted by report queries
+                    failed = True
+                latencies.append((time.perf_counter() - started) * 1000)
+                outcomes["desk_failed"] += failed
+        return latencies
+
+    storm = [asyncio.create_task(analyst(uid)) for uid in analyst_ids for _ in range(args.loops_per_analyst)]
+    await asyncio.sleep(args.warmup)
+    try:
+        latencies = await desk()
+    finally:
+        stop.set()
+        await asyncio.gather(*storm)
+
+    print(f"admission control : {'off' if args.no_admission else 'on'}")
+    print(f"history rows      : {args.history}")
+    print(f"report loops      : {len(storm)}")
+    print(f"reports admitted  : {outcomes['admitted']}  rejected(429): {outcomes['rejected']}")
+    print(f"issue-book failed : {outcomes['desk_failed']} / {len(latencies)}")
+    print(f"issue-book p50    : {statistics.median(latencies):.1f}ms")
+    print(f"issue-book p95    : {_percentile(latencies, 0.95):.1f}ms")
+    print(f"issue-book max    : {max(latencies):.1f}ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--history", type=int, default=10_000)
+    parser.add_argument("--analysts", type=int, default=5)
+    parser.add_argument("--loops-per-analyst", type=int, default=4)
+    parser.add_argument("--desk-ops", type=int, default=20)
+    parser.add_argument("--warmup", type=float, default=0.5)
+    parser.add_argument("--no-admission", action="store_true")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="lms-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    if args.no_admission:
+        os.environ["MAX_CONCURRENT_REPORTS"] = "0"
+        for klass in ("REPORT", "WRITE", "READ"):
+            os.environ[f"RATE_LIMIT_{klass}_PER_MINUTE"] = "0"
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
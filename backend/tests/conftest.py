@@ -0,0 +1,106 @@
+import os
+import tempfile
+
+# The engines read their configuration at import time, so point them at a
+# throwaway database before anything imports ``app``.
+_WORKDIR = tempfile.mkdtemp(prefix="lms-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_WORKDIR, 'library.db')}"
+os.environ["REPORT_JOBS_DIR"] = os.path.join(_WORKDIR, "report_jobs")
+for route_class in ("REPORT", "WRITE", "READ"):
+    os.environ[f"RATE_LIMIT_{route_class}_PER_MINUTE"] = "0"
+
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.auth import create_access_token
+from app.database import Base, SessionLocal, engine
+from app.main import app
+from app.memberships import clear_membership_cache
+from app.models import Membership, User
+
+
+@pytest.fixture(autouse=True)
+def clean_database():
+    yield
+    # Keep the seeded admin/user logins; everything else starts empty.
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            if table.name == "users":
+                conn.execute(table.delete().where(table.c.username.notin_(["admin", "user"])))
+            else:
+                conn.execute(table.delete())
+    clear_membership_cache()
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def _headers(username: str) -> dict[str, str]:
+    with SessionLocal() as session:
+        user = session.query(User).filter(User.username == username).one()
+        token = create_access_token({"sub": str(user.id), "role": user.role})
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def admin_headers():
+    return _headers("admin")
+
+
+@pytest.fixture
+def user_headers():
+    return _headers("user")
+
+
+@pytest.fixture
+def make_member():
+    """Factory creating a user with an active six-month membership; returns the user id."""
+
+    def make(username: str) -> int:
+        with SessionLocal() as session:
+            membership = Membership(
+                membership_number=f"M-{username}",
+                name=username,
+                membership_type="6_months",
+                start_date=date.today(),
+                end_date=date.today() + timedelta(days=180),
+                active=True,
+            )
+            session.add(membership)
+            session.flush()
+            user = User(name=username, username=username, password="x", role="user", membership_id=membership.id)
+            session.add(user)
+            session.commit()
+            return user.id
+
+    return make
+
+
+@pytest.fixture
+def add_book(client, admin_headers):
+    """Factory adding a copy through the API; returns the add-book response."""
+
+    def add(serial_no: str, title: str = "Dune", author: str = "Herbert") -> dict:
+        res = client.post(
+            "/maintenance/add-book",
+            headers=admin_headers,
+            json={"title": title, "author": author, "serial_no": serial_no},
+        )
+        assert res.status_code == 200, res.text
+        return res.json()
+
+    return add
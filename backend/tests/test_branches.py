@@ -0,0 +1,56 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.orm import sessionmaker
+
+from app import database
+from app.branches import create_partitions
+
+
+@pytest.fixture
+def north(tmp_path, monkeypatch):
+    """Map a ``north`` branch to its own SQLite file that enforces foreign keys."""
+    url = f"sqlite:///{tmp_path / 'north.db'}"
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def _enforce_foreign_keys(dbapi_connection, _):
+        dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+    monkeypatch.setitem(database.BRANCH_DATABASE_URLS, "north", url)
+    monkeypatch.setitem(database.partition_engines, url, engine)
+    monkeypatch.setitem(database.PartitionSessionLocals, url, sessionmaker(autocommit=False, autoflush=False, bind=engine))
+    database.LIBRARY_BRANCHES.append("north")
+    try:
+        create_partitions()
+        yield engine
+    finally:
+        database.LIBRARY_BRANCHES.remove("north")
+        engine.dispose()
+
+
+def test_branch_database_holds_only_branch_tables(north):
+    tables = set(inspect(north).get_table_names())
+    assert {"titles", "books", "transactions", "holds", "circulation_events"} <= tables
+    assert not tables & {"users", "memberships", "sequences", "idempotency_keys", "report_jobs"}
+
+
+def test_issue_at_mapped_branch_with_foreign_keys_enforced(client, admin_headers, make_member, north):
+    headers = {**admin_headers, "X-Branch": "north"}
+    user_id = make_member("northerner")
+    res = client.post(
+        "/maintenance/add-book",
+        headers=headers,
+        json={"title": "Dune", "author": "Herbert", "serial_no": "N-1"},
+    )
+    assert res.status_code == 200, res.text
+
+    res = client.post(
+        "/transactions/issue-book",
+        headers=headers,
+        json={"user_id": user_id, "book_id": res.json()["book_id"], "issue_date": date.today().isoformat()},
+    )
+
+    assert res.status_code == 200, res.text
+    assert res.json()["branch"] == "north"
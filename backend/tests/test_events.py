@@ -0,0 +1,107 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+from app import events
+from app.database import engine
+from app.dependencies import get_stream_user
+from app.auth import create_access_token
+from app.models import CirculationEvent, User
+
+
+def _event(db, event_id, age_seconds=0.0, branch="main"):
+    db.add(CirculationEvent(
+        id=event_id,
+        event_type=events.EVENT_ISSUED,
+        branch=branch,
+        transaction_id=event_id,
+        payload=json.dumps({"transaction_id": event_id}),
+        created_at=datetime.now() - timedelta(seconds=age_seconds),
+    ))
+    db.commit()
+
+
+class _Follower:
+    """Consume an SSE stream in the background, recording event ids."""
+
+    def __init__(self, after: int, branch: str = "main"):
+        self.seen: list[int] = []
+        self._task = asyncio.create_task(self._run(after, branch))
+
+    async def _run(self, after, branch):
+        async for frame in events.sse_stream(after, branch):
+            if frame.startswith("id: "):
+                self.seen.append(int(frame.split("\n", 1)[0][4:]))
+
+    async def polls(self, count: int = 3) -> list[int]:
+        await asyncio.sleep(events.SSE_POLL_SECONDS * count)
+        return self.seen
+
+    async def close(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+def test_stream_delivers_late_commit_below_cursor(db, monkeypatch):
+    monkeypatch.setattr(events, "SSE_POLL_SECONDS", 0.02)
+
+    async def scenario():
+        follower = _Follower(0)
+        _event(db, 5)
+        _event(db, 7)
+        assert await follower.polls() == [5, 7]
+        # Id 6 was allocated before 7 but its transaction commits later.
+        _event(db, 6)
+        assert await follower.polls() == [5, 7, 6]
+        await follower.close()
+
+    asyncio.run(scenario())
+
+
+def test_stream_resumes_from_settled_point(db, monkeypatch):
+    monkeypatch.setattr(events, "SSE_POLL_SECONDS", 0.02)
+    _event(db, 1, age_seconds=60)
+    _event(db, 2, age_seconds=60)
+    _event(db, 3)
+
+    async def scenario():
+        # The client last saw 3, but 3 is not settled yet, so it is re-sent;
+        # settled events are not.
+        follower = _Follower(3)
+        assert await follower.polls() == [3]
+        await follower.close()
+
+    asyncio.run(scenario())
+
+
+def test_stream_filters_other_branches(db, monkeypatch):
+    monkeypatch.setattr(events, "SSE_POLL_SECONDS", 0.02)
+    _event(db, 1, branch="north")
+    _event(db, 2)
+
+    async def scenario():
+        follower = _Follower(0)
+        assert await follower.polls() == [2]
+        await follower.close()
+
+    asyncio.run(scenario())
+
+
+def test_stream_holds_no_connection_between_polls(db, monkeypatch):
+    monkeypatch.setattr(events, "SSE_POLL_SECONDS", 0.02)
+    admin_id = db.query(User.id).filter(User.username == "admin").scalar()
+    db.rollback()  # return the fixture session's connection to the pool
+
+    user = get_stream_user(create_access_token({"sub": str(admin_id)}))
+    assert user.username == "admin"
+
+    async def scenario():
+        follower = _Follower(0)
+        await follower.polls()
+        assert engine.pool.checkedout() == 0
+        await follower.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,118 @@
+from datetime import date, datetime, timedelta
+
+from app.models import Book, Hold, Title
+from app.reservations import HOLD_PICKUP_DAYS, expire_uncollected_holds
+
+
+def _issue(client, headers, user_id, **ids):
+    return client.post(
+        "/transactions/issue-book",
+        headers=headers,
+        json={"user_id": user_id, "issue_date": date.today().isoformat(), **ids},
+    )
+
+
+def _return(client, headers, issued):
+    client.post(
+        "/transactions/return-book",
+        headers=headers,
+        json={"transaction_id": issued["transaction_id"], "serial_no": issued["serial_no"],
+              "return_date": date.today().isoformat()},
+    )
+    return client.post(
+        "/transactions/pay-fine",
+        headers=headers,
+        json={"transaction_id": issued["transaction_id"], "fine_paid": True},
+    ).json()
+
+
+def _place(client, headers, user_id, title_id):
+    res = client.post("/holds/place-hold", headers=headers, json={"user_id": user_id, "title_id": title_id})
+    assert res.status_code == 200, res.text
+    return res.json()
+
+
+def test_returned_copy_goes_to_holds_in_placement_order(client, admin_headers, make_member, add_book):
+    title_id = add_book("D-1")["title_id"]
+    borrower, first, second = make_member("borrower"), make_member("first"), make_member("second")
+    issued = _issue(client, admin_headers, borrower, title_id=title_id).json()
+
+    assert _place(client, admin_headers, first, title_id)["position"] == 1
+    assert _place(client, admin_headers, second, title_id)["position"] == 2
+
+    returned = _return(client, admin_headers, issued)
+    assert returned["held_for_user_id"] == first
+    queue = client.get(f"/holds/title/{title_id}", headers=admin_headers).json()
+    assert [(h["user_id"], h["status"], h["position"]) for h in queue] == [
+        (first, "ready", 0),
+        (second, "waiting", 1),
+    ]
+    assert queue[0]["pickup_by"] is not None
+
+    # Nobody else can take the copy set aside for the first hold.
+    assert _issue(client, admin_headers, second, title_id=title_id).status_code == 400
+    assert _issue(client, admin_headers, first, title_id=title_id).status_code == 200
+
+
+def test_uncollected_hold_expires_and_passes_copy_on(client, admin_headers, make_member, add_book, db):
+    title_id = add_book("D-1")["title_id"]
+    borrower, first, second = make_member("borrower"), make_member("first"), make_member("second")
+    issued = _issue(client, admin_headers, borrower, title_id=title_id).json()
+    _place(client, admin_headers, first, title_id)
+    _place(client, admin_headers, second, title_id)
+    _return(client, admin_headers, issued)
+
+    assert expire_uncollected_holds(db) == 0
+    later = datetime.now() + timedelta(days=HOLD_PICKUP_DAYS, hours=1)
+    assert expire_uncollected_holds(db, now=later) == 1
+
+    statuses = {h.user_id: h.status for h in db.query(Hold)}
+    assert statuses == {first: "expired", second: "ready"}
+    assert _issue(client, admin_headers, second, title_id=title_id).status_code == 200
+
+
+def test_expiring_the_last_hold_returns_copy_to_shelf(client, admin_headers, make_member, add_book, db):
+    title_id = add_book("D-1")["title_id"]
+    borrower, first = make_member("borrower"), make_member("first")
+    issued = _issue(client, admin_headers, borrower, title_id=title_id).json()
+    _place(client, admin_headers, first, title_id)
+    _return(client, admin_headers, issued)
+
+    expire_uncollected_holds(db, now=datetime.now() + timedelta(days=HOLD_PICKUP_DAYS + 1))
+
+    assert db.get(Title, title_id).available_copies == 1
+    assert db.query(Book).one().available
+
+
+def test_reserved_copy_cannot_be_shelved_by_update_book(client, admin_headers, make_member, add_book):
+    added = add_book("D-1")
+    borrower, first = make_member("borrower"), make_member("first")
+    issued = _issue(client, admin_headers, borrower, title_id=added["title_id"]).json()
+    _place(client, admin_headers, first, added["title_id"])
+    _return(client, admin_headers, issued)
+
+    res = client.put(
+        "/maintenance/update-book",
+        headers=admin_headers,
+        json={"book_id": added["book_id"], "title": "Dune", "author": "Herbert", "serial_no": "D-1", "available": True},
+    )
+    assert res.status_code == 400
+
+
+def test_ready_hold_whose_copy_went_out_is_not_collected(client, admin_headers, make_member, add_book, db):
+    added = add_book("D-1")
+    borrower, first, other = make_member("borrower"), make_member("first"), make_member("other")
+    issued = _issue(client, admin_headers, borrower, title_id=added["title_id"]).json()
+    _place(client, admin_headers, first, added["title_id"])
+    _return(client, admin_headers, issued)
+
+    # Simulate the copy leaking back onto the shelf and going out again.
+    book = db.get(Book, added["book_id"])
+    book.available = True
+    title = db.get(Title, added["title_id"])
+    title.available_copies = 1
+    db.commit()
+    assert _issue(client, admin_headers, other, book_id=added["book_id"]).status_code == 200
+
+    res = _issue(client, admin_headers, first, book_id=added["book_id"])
+    assert res.status_code == 409
@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+from app.auth import create_access_token
+from app.database import DEFAULT_BRANCH
+from app.idempotency import IDEMPOTENCY_HEADER
+from app.main import app
+from app.models import Book, IdempotencyRecord, User
+from app.routes import maintenance
+
+BOOK = {"title": "Dune", "author": "Herbert", "serial_no": "D-1"}
+
+
+def _add(client, headers, key, body=BOOK):
+    return client.post("/maintenance/add-book", headers={**headers, IDEMPOTENCY_HEADER: key}, json=body)
+
+
+def test_same_key_and_body_replays_stored_response(client, admin_headers, db):
+    first = _add(client, admin_headers, "k1")
+    second = _add(client, admin_headers, "k1")
+
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json()
+    assert second.headers.get("Idempotent-Replayed") == "true"
+    assert "Idempotent-Replayed" not in first.headers
+    assert db.query(Book).count() == 1
+
+
+def test_same_key_with_different_body_is_rejected(client, admin_headers, db):
+    assert _add(client, admin_headers, "k1").status_code == 200
+    res = _add(client, admin_headers, "k1", {**BOOK, "serial_no": "D-2"})
+
+    assert res.status_code == 422
+    assert db.query(Book).count() == 1
+
+
+def test_same_key_at_another_branch_is_rejected(client, admin_headers, db):
+    assert _add(client, admin_headers, "k1").status_code == 200
+
+    same_branch = _add(client, {**admin_headers, "X-Branch": DEFAULT_BRANCH}, "k1")
+    other_branch = _add(client, {**admin_headers, "X-Branch": "north"}, "k1")
+
+    assert same_branch.headers.get("Idempotent-Replayed") == "true"
+    assert other_branch.status_code == 422
+    assert db.query(Book).count() == 1
+
+
+def test_business_rejection_is_replayed(client, admin_headers):
+    assert _add(client, admin_headers, "k1").status_code == 200
+    duplicate = _add(client, admin_headers, "k2")
+    replay = _add(client, admin_headers, "k2")
+
+    assert duplicate.status_code == replay.status_code == 400
+    assert replay.headers.get("Idempotent-Replayed") == "true"
+
+
+def test_key_is_scoped_to_caller(client, admin_headers, db):
+    second_admin = User(name="Second", username="admin2", password="x", role="admin")
+    db.add(second_admin)
+    db.commit()
+    other_headers = {"Authorization": "Bearer " + create_access_token({"sub": str(second_admin.id)})}
+
+    assert _add(client, admin_headers, "k1").status_code == 200
+    other = _add(client, other_headers, "k1", {**BOOK, "serial_no": "D-2"})
+
+    assert other.status_code == 200
+    assert "Idempotent-Replayed" not in other.headers
+    assert db.query(Book).count() == 2
+
+
+def test_in_flight_key_gets_409(client, admin_headers, db):
+    first = _add(client, admin_headers, "k1")
+    record = db.query(IdempotencyRecord).one()
+    record.status_code = None  # as if the first attempt were still running
+    db.commit()
+
+    res = _add(client, admin_headers, "k1")
+    assert first.status_code == 200
+    assert res.status_code == 409
+
+
+def test_handler_exception_forgets_key(admin_headers, db, monkeypatch):
+    def boom(*_):
+        raise RuntimeError("storage offline")
+
+    with TestClient(app, raise_server_exceptions=False) as client:
+        monkeypatch.setattr(maintenance, "pass_on_copy", boom)
+        failed = _add(client, admin_headers, "k1")
+        assert failed.status_code == 500
+        assert db.query(IdempotencyRecord).count() == 0
+
+        monkeypatch.undo()
+        retried = _add(client, admin_headers, "k1")
+        assert retried.status_code == 200
+        assert "Idempotent-Replayed" not in retried.headers
+    assert db.query(Book).count() == 1
+
+
+def test_expired_key_runs_again(client, admin_headers, db):
+    assert _add(client, admin_headers, "k1").status_code == 200
+    record = db.query(IdempotencyRecord).one()
+    record.expires_at = datetime.now() - timedelta(seconds=1)
+    db.commit()
+
+    res = _add(client, admin_headers, "k1")
+    assert res.status_code == 400  # a real second attempt: duplicate serial
+    assert "Idempotent-Replayed" not in res.headers
+
+
+def test_reads_ignore_the_header(client, admin_headers, db):
+    res = client.get("/maintenance/memberships", headers={**admin_headers, IDEMPOTENCY_HEADER: "k1"})
+    assert res.status_code == 200
+    assert db.query(IdempotencyRecord).count() == 0
@@ -0,0 +1,61 @@
+from datetime import date
+
+from app import inventory
+from app.database import SessionLocal
+from app.models import Title
+
+
+def test_get_or_create_title_reuses_a_concurrently_created_title(db, monkeypatch):
+    # Another request inserts the title between our SELECT and our INSERT.
+    other = SessionLocal()
+    other.add(Title(branch="main", title="Dune", author="Herbert", media_type="book",
+                    category="sf", total_copies=0, available_copies=0))
+    other.commit()
+    other.close()
+
+    find = inventory._find_title
+    calls = []
+
+    def stale_first_lookup(*args):
+        calls.append(args)
+        return None if len(calls) == 1 else find(*args)
+
+    monkeypatch.setattr(inventory, "_find_title", stale_first_lookup)
+    title = inventory.get_or_create_title(db, "Dune", "Herbert", "book", "sf", branch="main")
+    db.commit()
+
+    assert title.title == "Dune"
+    assert db.query(Title).count() == 1
+
+
+def test_add_book_creates_title_once(client, admin_headers, db):
+    for serial in ("D-1", "D-2"):
+        res = client.post(
+            "/maintenance/add-book",
+            headers=admin_headers,
+            json={"title": "Dune", "author": "Herbert", "serial_no": serial, "media_type": "book", "category": "sf"},
+        )
+        assert res.status_code == 200, res.text
+    title = db.query(Title).one()
+    assert (title.total_copies, title.available_copies) == (2, 2)
+
+
+def test_copy_on_loan_cannot_be_shelved_by_update_book(client, admin_headers, make_member, add_book, db):
+    added = add_book("D-1")
+    borrower = make_member("borrower")
+    res = client.post(
+        "/transactions/issue-book",
+        headers=admin_headers,
+        json={"user_id": borrower, "title_id": added["title_id"], "issue_date": date.today().isoformat()},
+    )
+    assert res.status_code == 200, res.text
+
+    res = client.put(
+        "/maintenance/update-book",
+        headers=admin_headers,
+        json={"book_id": added["book_id"], "title": "Dune", "author": "Herbert", "serial_no": "D-1", "available": True},
+    )
+
+    assert res.status_code == 400
+    title = db.query(Title).one()
+    assert (title.total_copies, title.available_copies) == (1, 0)
@@ -0,0 +1,84 @@
+from datetime import date, timedelta
+
+from app import memberships
+from app.memberships import expire_lapsed_memberships, invalidate_membership, membership_window
+from app.models import Membership
+
+
+def _membership(db, number="M-1", days_left=30, active=True):
+    membership = Membership(
+        membership_number=number,
+        name="Member",
+        membership_type="6_months",
+        start_date=date.today() - timedelta(days=180),
+        end_date=date.today() + timedelta(days=days_left),
+        active=active,
+    )
+    db.add(membership)
+    db.commit()
+    return membership
+
+
+def _update(client, headers, action, number="M-1"):
+    return client.put(
+        "/maintenance/update-membership",
+        headers=headers,
+        json={"membership_number": number, "action": action, "extension_months": 6},
+    )
+
+
+def test_lapsed_membership_can_be_renewed(client, admin_headers, db):
+    membership = _membership(db, days_left=-3)
+    # The client's startup sweep may already have expired it.
+    expire_lapsed_memberships(db)
+    db.refresh(membership)
+    assert not membership.active
+
+    res = _update(client, admin_headers, "extend")
+
+    assert res.status_code == 200, res.text
+    db.refresh(membership)
+    assert membership.active
+    # Renewed from today, not from the old end date.
+    assert membership.end_date == date.today() + timedelta(days=180)
+
+
+def test_cancelled_membership_cannot_be_extended(client, admin_headers, db):
+    _membership(db)
+    assert _update(client, admin_headers, "cancel").status_code == 200
+
+    res = _update(client, admin_headers, "extend")
+    assert res.status_code == 400
+
+
+def test_invalidation_during_lookup_is_not_overwritten(db, monkeypatch):
+    membership = _membership(db)
+    stale_query = db.query
+
+    def query_then_invalidate(*args):
+        # A writer commits and invalidates while our read is in flight.
+        invalidate_membership(membership.id)
+        return stale_query(*args)
+
+    monkeypatch.setattr(db, "query", query_then_invalidate)
+    window = membership_window(db, membership.id)
+
+    assert window.active
+    assert membership.id not in memberships._cache
+
+
+def test_cached_window_expires_after_ttl(db, monkeypatch):
+    membership = _membership(db)
+    assert membership_window(db, membership.id).active
+
+    # Another worker cancels it; this process never hears about it.
+    db.query(Membership).filter(Membership.id == membership.id).update({"active": False})
+    db.commit()
+    assert membership_window(db, membership.id).active  # still cached
+
+    monkeypatch.setattr(memberships, "MEMBERSHIP_CACHE_TTL_SECONDS", 0)
+    invalidate_membership(membership.id)
+    assert not membership_window(db, membership.id).active
+    db.query(Membership).filter(Membership.id == membership.id).update({"active": True})
+    db.commit()
+    assert membership_window(db, membership.id).active  # a zero TTL always re-reads
@@ -0,0 +1,138 @@
+from sqlalchemy import create_engine, inspect, text
+
+from app.database import DEFAULT_BRANCH
+from app.migrations import pending_steps, upgrade
+
+# Schema as created by the first release, before titles were split out.
+BASELINE_SCHEMA = [
+    """CREATE TABLE memberships (
+        id INTEGER PRIMARY KEY, membership_number VARCHAR(30) NOT NULL UNIQUE, name VARCHAR(100) NOT NULL,
+        membership_type VARCHAR(20) NOT NULL, start_date DATE NOT NULL, end_date DATE NOT NULL, active BOOLEAN)""",
+    """CREATE TABLE users (
+        id INTEGER PRIMARY KEY, username VARCHAR(50) NOT NULL UNIQUE, name VARCHAR(100) NOT NULL,
+        password VARCHAR(255) NOT NULL, role VARCHAR(20), membership_id INTEGER REFERENCES memberships (id))""",
+    """CREATE TABLE books (
+        id INTEGER PRIMARY KEY, title VARCHAR(100) NOT NULL, author VARCHAR(100) NOT NULL,
+        serial_no VARCHAR(50) NOT NULL UNIQUE, media_type VARCHAR(20), category VARCHAR(50), available BOOLEAN)""",
+    "CREATE INDEX ix_books_id ON books (id)",
+    """CREATE TABLE transactions (
+        id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users (id),
+        book_id INTEGER NOT NULL REFERENCES books (id), issue_date DATE NOT NULL, due_date DATE NOT NULL,
+        pending_return_date DATE, return_date DATE, calculated_fine INTEGER, fine_paid INTEGER, remarks TEXT)""",
+]
+
+
+def _baseline_engine(tmp_path):
+    baseline = create_engine(f"sqlite:///{tmp_path / 'baseline.db'}")
+    with baseline.begin() as conn:
+        for statement in BASELINE_SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(text(
+            "INSERT INTO books (title, author, serial_no, media_type, category, available) VALUES "
+            "('Dune', 'Herbert', 'D-1', 'book', 'sf', 1), ('Dune', 'Herbert', 'D-2', 'book', 'sf', 0), "
+            "('Alien', 'Scott', 'A-1', 'movie', 'sf', 1)"
+        ))
+    return baseline
+
+
+def test_upgrade_splits_baseline_books_into_titles(tmp_path):
+    baseline = _baseline_engine(tmp_path)
+    with baseline.connect() as conn:
+        assert pending_steps(conn)
+
+    upgrade(baseline)
+
+    with baseline.connect() as conn:
+        assert pending_steps(conn) == []
+        assert "title" not in {c["name"] for c in inspect(conn).get_columns("books")}
+        titles = conn.execute(text(
+            "SELECT title, media_type, total_copies, available_copies FROM titles ORDER BY title"
+        )).all()
+        assert [tuple(t) for t in titles] == [("Alien", "movie", 1, 1), ("Dune", "book", 2, 1)]
+        orphans = conn.execute(text("SELECT COUNT(*) FROM books WHERE title_id IS NULL")).scalar()
+        assert orphans == 0
+        # Transactions may live in a branch database, which has no users table.
+        assert "users" not in {fk["referred_table"] for fk in inspect(conn).get_foreign_keys("transactions")}
+
+
+def test_upgrade_is_idempotent(tmp_path):
+    baseline = _baseline_engine(tmp_path)
+    upgrade(baseline)
+    assert upgrade(baseline) == []
+
+
+def test_upgrade_marks_early_deactivations_as_cancelled(tmp_path):
+    baseline = _baseline_engine(tmp_path)
+    with baseline.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO memberships (membership_number, name, membership_type, start_date, end_date, active) VALUES "
+            "('M-1', 'Cancelled', '6_months', '2020-01-01', '2999-01-01', 0), "
+            "('M-2', 'Lapsed', '6_months', '2020-01-01', '2020-07-01', 0), "
+            "('M-3', 'Current', '6_months', '2020-01-01', '2999-01-01', 1)"
+        ))
+
+    upgrade(baseline)
+
+    with baseline.connect() as conn:
+        rows = conn.execute(text("SELECT membership_number, cancelled FROM memberships ORDER BY id")).all()
+    assert [tuple(r) for r in rows] == [("M-1", 1), ("M-2", 0), ("M-3", 0)]
+
+
+# Schema as created just before circulation data was partitioned by branch.
+PRE_BRANCH_SCHEMA = [
+    """CREATE TABLE titles (
+        id INTEGER PRIMARY KEY, title VARCHAR(100) NOT NULL, author VARCHAR(100) NOT NULL,
+        media_type VARCHAR(20), category VARCHAR(50), total_copies INTEGER NOT NULL,
+        available_copies INTEGER NOT NULL,
+        CONSTRAINT uq_titles_title_author_media UNIQUE (title, author, media_type))""",
+    "CREATE INDEX ix_titles_id ON titles (id)",
+    "CREATE INDEX ix_titles_title ON titles (title)",
+    """CREATE TABLE books (
+        id INTEGER PRIMARY KEY, title_id INTEGER NOT NULL REFERENCES titles (id),
+        serial_no VARCHAR(50) NOT NULL UNIQUE, available BOOLEAN)""",
+    """CREATE TABLE memberships (
+        id INTEGER PRIMARY KEY, membership_number VARCHAR(30) NOT NULL UNIQUE, name VARCHAR(100) NOT NULL,
+        membership_type VARCHAR(20) NOT NULL, start_date DATE NOT NULL, end_date DATE NOT NULL, active BOOLEAN)""",
+    """CREATE TABLE transactions (
+        id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, book_id INTEGER NOT NULL REFERENCES books (id),
+        issue_date DATE NOT NULL, due_date DATE NOT NULL, pending_return_date DATE, return_date DATE,
+        calculated_fine INTEGER, fine_paid INTEGER, remarks TEXT)""",
+    """CREATE TABLE holds (
+        id INTEGER PRIMARY KEY, title_id INTEGER NOT NULL REFERENCES titles (id), user_id INTEGER NOT NULL,
+        book_id INTEGER, status VARCHAR(20) NOT NULL, placed_at DATETIME NOT NULL, ready_at DATETIME)""",
+]
+
+
+def test_upgrade_partitions_pre_branch_tables(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pre_branch.db'}")
+    with engine.begin() as conn:
+        for statement in PRE_BRANCH_SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(text(
+            "INSERT INTO titles (title, author, media_type, category, total_copies, available_copies) "
+            "VALUES ('Dune', 'Herbert', 'book', 'sf', 1, 1)"
+        ))
+        conn.execute(text("INSERT INTO books (title_id, serial_no, available) VALUES (1, 'D-1', 1)"))
+        conn.execute(text(
+            "INSERT INTO holds (title_id, user_id, status, placed_at) VALUES (1, 1, 'waiting', '2026-01-01')"
+        ))
+
+    applied = upgrade(engine)
+
+    assert "add branch columns" in applied and "make titles unique per branch" in applied
+    with engine.begin() as conn:
+        assert pending_steps(conn) == []
+        inspector = inspect(conn)
+        assert {"ix_memberships_active_end_date"} <= {i["name"] for i in inspector.get_indexes("memberships")}
+        assert {"ix_holds_status_ready_at"} <= {i["name"] for i in inspector.get_indexes("holds")}
+        assert {"ix_transactions_branch_open_due"} <= {i["name"] for i in inspector.get_indexes("transactions")}
+        # Existing rows moved to the default branch and kept their ids.
+        assert tuple(conn.execute(text("SELECT id, branch FROM titles")).one()) == (1, DEFAULT_BRANCH)
+        assert conn.execute(text("SELECT branch FROM books")).scalar() == DEFAULT_BRANCH
+        # The same title can now be catalogued at another branch.
+        conn.execute(text(
+            "INSERT INTO titles (branch, title, author, media_type, category, total_copies, available_copies) "
+            "VALUES ('north', 'Dune', 'Herbert', 'book', 'sf', 0, 0)"
+        ))
+        fk_targets = {fk["referred_table"] for fk in inspector.get_foreign_keys("holds")}
+        assert "titles" in fk_targets
@@ -0,0 +1,36 @@
+from app import onboarding
+from app.auth import hash_password
+from app.models import User
+from app.routes import maintenance
+
+
+def _csv(rows: int) -> bytes:
+    lines = ["name,username,password,duration_months,role"]
+    lines += [f"Member {i},member{i},secret{i},6,user" for i in range(rows)]
+    return "\n".join(lines).encode("utf-8")
+
+
+def test_bulk_import_rejects_oversized_uploads(client, admin_headers, db, monkeypatch):
+    monkeypatch.setattr(maintenance, "IMPORT_MAX_UPLOAD_BYTES", 64)
+
+    res = client.post(
+        "/maintenance/bulk-import",
+        headers=admin_headers,
+        files={"file": ("members.csv", _csv(10), "text/csv")},
+    )
+
+    assert res.status_code == 413
+    assert db.query(User).filter(User.username.like("member%")).count() == 0
+
+
+def test_uploads_share_the_startup_hash_pool(client, monkeypatch):
+    monkeypatch.setattr(onboarding, "PARALLEL_HASH_MIN_ROWS", 1)
+    onboarding.start_hash_pool(workers=2)
+    pool = onboarding._hash_pool
+    try:
+        passwords = [f"secret{i}" for i in range(20)]
+        assert onboarding.hash_passwords(passwords, workers=2) == [hash_password(p) for p in passwords]
+        onboarding.hash_passwords(passwords, workers=2)
+        assert onboarding._hash_pool is pool
+    finally:
+        onboarding.shutdown_hash_pool()
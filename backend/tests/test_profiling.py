@@ -0,0 +1,48 @@
+import pytest
+
+from app import profiling
+from app.auth import hash_password
+
+
+@pytest.fixture
+def armed(client, admin_headers):
+    res = client.put(
+        "/admin/profiling",
+        headers=admin_headers,
+        json={"routes": ["/maintenance/user-management", "/maintenance/memberships"], "duration_seconds": 60},
+    )
+    assert res.status_code == 200, res.text
+    yield
+    profiling.disable_profiling()
+    profiling._profiles.clear()
+
+
+def _profile(client, admin_headers, res) -> dict:
+    profile_id = res.headers[profiling.PROFILE_ID_HEADER]
+    return client.get(f"/admin/profiles/{profile_id}", headers=admin_headers).json()
+
+
+def test_profiles_never_store_parameter_values(client, admin_headers, armed):
+    res = client.post(
+        "/maintenance/user-management",
+        headers=admin_headers,
+        json={"mode": "new", "name": "Profiled", "username": "profiled", "password": "s3cret-pw"},
+    )
+    assert res.status_code == 200, res.text
+
+    detail = _profile(client, admin_headers, res)
+
+    assert detail["queries"]
+    dumped = repr(detail)
+    assert hash_password("s3cret-pw") not in dumped
+    assert "profiled" not in dumped
+
+
+def test_queries_per_profile_are_capped(client, admin_headers, armed, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_MAX_QUERIES", 1)
+
+    res = client.get("/maintenance/memberships", headers=admin_headers)
+
+    detail = _profile(client, admin_headers, res)
+    assert len(detail["queries"]) == 1
+    assert detail["dropped_queries"] >= 1
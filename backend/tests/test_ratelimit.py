@@ -0,0 +1,99 @@
+import asyncio
+
+from app.ratelimit import AdmissionControlMiddleware, BucketSpec, TokenBuckets, route_class
+
+LIMITS = {
+    "report": BucketSpec(per_minute=60, burst=2),
+    "write": BucketSpec(per_minute=60, burst=3),
+    "read": BucketSpec(per_minute=0, burst=1),
+}
+
+
+def test_route_classes():
+    assert route_class("GET", "/reports/fine-report") == "report"
+    assert route_class("POST", "/reports/jobs") == "write"
+    assert route_class("GET", "/reports/jobs/abc") == "read"
+    assert route_class("POST", "/transactions/issue-book") == "write"
+    assert route_class("GET", "/transactions/active-issues") == "read"
+
+
+def test_bucket_allows_burst_then_reports_wait(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("app.ratelimit.time.monotonic", lambda: clock[0])
+    buckets = TokenBuckets(LIMITS)
+
+    assert [buckets.take("alice", "write") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert buckets.take("alice", "write") == 1.0  # one token per second at 60/min
+    assert buckets.take("bob", "write") == 0.0  # callers have their own buckets
+
+    clock[0] += 1.0
+    assert buckets.take("alice", "write") == 0.0
+
+
+def test_zero_rate_disables_bucket():
+    buckets = TokenBuckets(LIMITS)
+    assert all(buckets.take("alice", "read") == 0.0 for _ in range(1000))
+
+
+def _scope(path: str, method: str = "GET") -> dict:
+    return {"type": "http", "method": method, "path": path, "headers": [], "client": ("10.0.0.1", 1234)}
+
+
+async def _call(middleware, scope) -> int:
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    await middleware(scope, receive, send)
+    return sent[0]["status"]
+
+
+async def _ok(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def test_rate_limited_request_gets_429_with_retry_after():
+    middleware = AdmissionControlMiddleware(_ok, limits=LIMITS, max_concurrent_reports=0)
+    statuses = [asyncio.run(_call(middleware, _scope("/reports/fine-report"))) for _ in range(3)]
+    assert statuses == [200, 200, 429]
+
+
+def test_exempt_paths_skip_the_buckets():
+    middleware = AdmissionControlMiddleware(_ok, limits=LIMITS, max_concurrent_reports=0)
+    statuses = [asyncio.run(_call(middleware, _scope("/app/login.html"))) for _ in range(10)]
+    assert set(statuses) == {200}
+
+
+def test_report_slots_cap_concurrency():
+    async def scenario():
+        release = asyncio.Event()
+        running = []
+
+        async def slow_report(scope, receive, send):
+            if scope["path"].startswith("/reports"):
+                running.append(scope["path"])
+                await release.wait()
+            await _ok(scope, receive, send)
+
+        unlimited = {name: BucketSpec(per_minute=0, burst=1) for name in LIMITS}
+        middleware = AdmissionControlMiddleware(
+            slow_report, limits=unlimited, max_concurrent_reports=2, report_queue_timeout=0.1
+        )
+        first = [asyncio.create_task(_call(middleware, _scope("/reports/fine-report"))) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        # Both slots are taken: the third report waits, then is turned away.
+        assert await _call(middleware, _scope("/reports/fine-report")) == 429
+        assert len(running) == 2
+        # Desk traffic is never queued behind reports.
+        assert await asyncio.wait_for(_call(middleware, _scope("/transactions/active-issues")), 1) == 200
+
+        release.set()
+        assert await asyncio.gather(*first) == [200, 200]
+        assert await _call(middleware, _scope("/reports/fine-report")) == 200
+
+    asyncio.run(scenario())
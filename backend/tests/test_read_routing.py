@@ -0,0 +1,27 @@
+from app import database
+from app.auth import subject_from_authorization
+from app.database import get_db, wrote_recently
+from app.models import Membership
+
+
+def test_get_db_works_outside_a_request():
+    sessions = get_db()
+    db = next(sessions)
+    try:
+        assert db.query(Membership).count() == 0
+    finally:
+        sessions.close()
+
+
+def test_write_endpoints_keep_the_caller_on_the_primary(client, admin_headers, monkeypatch):
+    monkeypatch.setattr(database, "_recent_writers", {})
+    subject = subject_from_authorization(admin_headers["Authorization"])
+
+    res = client.post(
+        "/maintenance/add-membership",
+        headers=admin_headers,
+        json={"member_name": "Reader", "duration_months": 6},
+    )
+
+    assert res.status_code == 200, res.text
+    assert wrote_recently(subject)
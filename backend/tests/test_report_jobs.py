@@ -0,0 +1,92 @@
+import json
+from datetime import date, datetime, timedelta
+
+from app import report_jobs
+from app.models import ReportJob
+from app.report_jobs import JOB_FAILED, JOB_RUNNING, WORKER_ID, fail_interrupted_jobs, submit_report_job
+from app.routes.reports import REPORT_DEFINITIONS
+
+
+class _Idle:
+    def submit(self, *args):
+        pass
+
+
+def _job(db, job_id, worker_id, heartbeat_at):
+    db.add(ReportJob(
+        id=job_id,
+        report_type="issued-books",
+        params="{}",
+        dedup_key=job_id,
+        status=JOB_RUNNING,
+        created_at=datetime.now(),
+        worker_id=worker_id,
+        heartbeat_at=heartbeat_at,
+    ))
+    db.commit()
+
+
+def test_only_jobs_with_lapsed_leases_are_failed(db):
+    now = datetime.now()
+    _job(db, "live", "sibling", now)
+    _job(db, "dead", "crashed", now - timedelta(seconds=report_jobs.REPORT_JOB_LEASE_SECONDS + 1))
+    _job(db, "legacy", None, None)
+    _job(db, "mine", WORKER_ID, now - timedelta(days=1))
+
+    assert fail_interrupted_jobs(now) == 2
+
+    statuses = {job.id: job.status for job in db.query(ReportJob)}
+    assert statuses == {"live": JOB_RUNNING, "dead": JOB_FAILED, "legacy": JOB_FAILED, "mine": JOB_RUNNING}
+
+
+def test_date_dependent_reports_key_on_the_day(db, monkeypatch):
+    monkeypatch.setattr(report_jobs, "_pool", lambda: _Idle())
+    definition = REPORT_DEFINITIONS["overdue-returns"]
+
+    first, _ = submit_report_job(db, "overdue-returns", definition, {})
+    assert json.loads(first.params) == {"as_of": date.today().isoformat()}
+    db.query(ReportJob).update({"status": report_jobs.JOB_DONE, "data_version": 0})
+    db.commit()
+
+    class Tomorrow(date):
+        @classmethod
+        def today(cls):
+            return date.today() + timedelta(days=1)
+
+    monkeypatch.setattr(report_jobs, "date", Tomorrow)
+    second, how = submit_report_job(db, "overdue-returns", definition, {})
+
+    assert how == "queued"
+    assert second.dedup_key != first.dedup_key
+
+
+def test_concurrent_submission_from_another_worker_is_deduplicated(db, monkeypatch):
+    monkeypatch.setattr(report_jobs, "_pool", lambda: _Idle())
+    first, how = submit_report_job(db, "issued-books", REPORT_DEFINITIONS["issued-books"], {})
+    assert how == "queued"
+
+    # Another worker's checks ran before ``first`` was committed, so only the
+    # unique in-flight key stops it from queueing a duplicate.
+    lookup = report_jobs._in_flight
+    calls = []
+
+    def stale_lookups(*args):
+        calls.append(args)
+        return None if len(calls) <= 2 else lookup(*args)
+
+    monkeypatch.setattr(report_jobs, "_in_flight", stale_lookups)
+    monkeypatch.setattr(report_jobs, "data_version", lambda branches=None: -1)  # no cache hit
+    second, how = submit_report_job(db, "issued-books", REPORT_DEFINITIONS["issued-books"], {})
+
+    assert (second.id, how) == (first.id, "deduplicated")
+    assert db.query(ReportJob).count() == 1
+
+
+def test_finished_job_frees_its_key(db, monkeypatch):
+    monkeypatch.setattr(report_jobs, "_pool", lambda: _Idle())
+    first, _ = submit_report_job(db, "issued-books", REPORT_DEFINITIONS["issued-books"], {})
+    report_jobs._set_status(first.id, status=JOB_FAILED)
+
+    second, how = submit_report_job(db, "issued-books", REPORT_DEFINITIONS["issued-books"], {})
+
+    assert how == "queued" and second.id != first.id
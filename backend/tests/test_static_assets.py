@@ -0,0 +1,82 @@
+import pytest
+
+from app import static_assets
+from app.static_assets import CACHE_IMMUTABLE, Asset, CACHE_REVALIDATE, _choose_encoding, build_assets
+
+PAGE = b'<html><head><link rel="stylesheet" href="../css/site.css"></head>' \
+       b'<body><script src="../js/app.js"></script><a href="https://example.com/x.js">x</a></body></html>'
+SCRIPT = b"const greeting = 'hello';\n" * 200
+
+
+@pytest.fixture
+def assets(tmp_path, monkeypatch):
+    (tmp_path / "css").mkdir()
+    (tmp_path / "js").mkdir()
+    (tmp_path / "pages").mkdir()
+    (tmp_path / "css" / "site.css").write_bytes(b"body { color: black; }\n" * 100)
+    (tmp_path / "js" / "app.js").write_bytes(SCRIPT)
+    (tmp_path / "pages" / "home.html").write_bytes(PAGE)
+    built = build_assets(str(tmp_path))
+    monkeypatch.setattr(static_assets, "_assets", built)
+    return built
+
+
+def _hashed(assets, plain):
+    stem = plain.rsplit(".", 1)[0]
+    return next(path for path in assets if path.startswith(stem + ".") and path != plain)
+
+
+def test_pages_reference_hashed_assets(assets):
+    page = assets["pages/home.html"].body
+    css, js = _hashed(assets, "css/site.css"), _hashed(assets, "js/app.js")
+
+    assert f'href="../{css}"'.encode() in page
+    assert f'src="../{js}"'.encode() in page
+    assert b'href="https://example.com/x.js"' in page  # external refs untouched
+
+
+def test_hashed_assets_are_immutable_and_pages_revalidate(client, assets):
+    js = client.get(f"/app/{_hashed(assets, 'js/app.js')}")
+    page = client.get("/app/pages/home.html")
+
+    assert js.headers["cache-control"] == CACHE_IMMUTABLE
+    assert page.headers["cache-control"] == CACHE_REVALIDATE
+    assert client.get("/app/js/app.js").headers["cache-control"] == CACHE_REVALIDATE
+
+
+def test_matching_etag_gets_304(client, assets):
+    first = client.get("/app/pages/home.html")
+
+    again = client.get("/app/pages/home.html", headers={"If-None-Match": first.headers["etag"]})
+
+    assert again.status_code == 304
+    assert again.content == b""
+
+
+def test_encoding_follows_accept_encoding(client, assets):
+    gzipped = client.get("/app/js/app.js", headers={"Accept-Encoding": "gzip"})
+    plain = client.get("/app/js/app.js", headers={"Accept-Encoding": "identity"})
+
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert gzipped.content == SCRIPT  # decoded by the client
+    assert "content-encoding" not in plain.headers
+    assert "Accept-Encoding" in plain.headers["vary"]
+
+
+def test_explicit_q_zero_beats_wildcard(assets):
+    asset = assets["js/app.js"]
+
+    assert _choose_encoding("gzip;q=0, *", asset) == ("br" if "br" in asset.encodings else None)
+    assert _choose_encoding("*;q=0", asset) is None
+    assert _choose_encoding("GZIP; q=0.5", asset) == "gzip"
+    gzip_only = Asset(b"x" * 100, "text/plain", 'W/"x"', CACHE_REVALIDATE, {"gzip": b"x"})
+    assert _choose_encoding("gzip;q=0, *", gzip_only) is None
+    assert _choose_encoding("br, *", gzip_only) == "gzip"
+
+
+def test_api_responses_are_gzipped_above_the_threshold(client, admin_headers):
+    large = client.get("/openapi.json", headers={"Accept-Encoding": "gzip"})
+    small = client.get("/admin/profiling", headers={**admin_headers, "Accept-Encoding": "gzip"})
+
+    assert large.headers["content-encoding"] == "gzip"
+    assert "content-encoding" not in small.headers
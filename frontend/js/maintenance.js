@@ -1,10 +1,16 @@
-const API = "http://127.0.0.1:8000";
+// Same origin when served by the API under /app; the local dev server when opened from disk.
+const API = window.location.protocol === "file:" ? "http://127.0.0.1:8000" : window.location.origin;
+
+// Desk branch chosen on the dashboard; the backend falls back to its default branch when unset.
+const BRANCH = localStorage.getItem("branch");
 
 function headers() {
-  return {
+  const result = {
     "Content-Type": "application/json",
     Authorization: "Bearer " + localStorage.getItem("token"),
   };
+  if (BRANCH) result["X-Branch"] = BRANCH;
+  return result;
 }
 
 function setDashboardLink() {
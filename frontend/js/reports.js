@@ -1,4 +1,5 @@
-const API = "http://127.0.0.1:8000";
+// Same origin when served by the API under /app; the local dev server when opened from disk.
+const API = window.location.protocol === "file:" ? "http://127.0.0.1:8000" : window.location.origin;
 
 function reportHeaders() {
   return { Authorization: "Bearer " + localStorage.getItem("token") };
@@ -32,13 +33,14 @@ async function loadIssuedReport() {
   const res = await fetch(`${API}/reports/issued-books`, { headers: reportHeaders() });
   const data = await res.json();
   const table = document.getElementById("table");
-  table.innerHTML = "<tr><th>Transaction</th><th>User</th><th>Book</th><th>Issue</th><th>Due</th><th>Status</th></tr>";
+  // Transaction ids repeat across branch databases; the branch tells them apart.
+  table.innerHTML = "<tr><th>Branch</th><th>Transaction</th><th>User</th><th>Book</th><th>Issue</th><th>Due</th><th>Status</th></tr>";
   if (!res.ok) {
     if (msg) msg.innerText = data.detail || "Unable to load issued books report";
     return;
   }
   data.forEach((r) => {
-    table.innerHTML += `<tr><td>${r.transaction_id}</td><td>${r.user_id}</td><td>${r.book_id}</td><td>${r.issue_date}</td><td>${r.due_date}</td><td>${r.status}</td></tr>`;
+    table.innerHTML += `<tr><td>${r.branch}</td><td>${r.transaction_id}</td><td>${r.user_id}</td><td>${r.book_id}</td><td>${r.issue_date}</td><td>${r.due_date}</td><td>${r.status}</td></tr>`;
   });
 }
 
@@ -50,7 +52,7 @@ async function loadFineReports() {
   const table = document.getElementById("fineTable");
   table.innerHTML = `
     <tr>
-      <th>Transaction ID</th><th>User ID</th><th>Book ID</th><th>Due Date</th>
+      <th>Branch</th><th>Transaction ID</th><th>User ID</th><th>Book ID</th><th>Due Date</th>
       <th>Return Date</th><th>Fine</th><th>Paid</th><th>Status</th>
     </tr>`;
   if (!res.ok) {
@@ -58,7 +60,7 @@ async function loadFineReports() {
     return;
   }
   data.forEach((t) => {
-    table.innerHTML += `<tr><td>${t.transaction_id}</td><td>${t.user_id}</td><td>${t.book_id}</td><td>${t.due_date}</td><td>${t.return_date ?? "-"}</td><td>${t.fine}</td><td>${t.fine_paid}</td><td>${t.status}</td></tr>`;
+    table.innerHTML += `<tr><td>${t.branch}</td><td>${t.transaction_id}</td><td>${t.user_id}</td><td>${t.book_id}</td><td>${t.due_date}</td><td>${t.return_date ?? "-"}</td><td>${t.fine}</td><td>${t.fine_paid}</td><td>${t.status}</td></tr>`;
   });
 }
 
@@ -1,10 +1,39 @@
-const API = "http://127.0.0.1:8000";
+// Same origin when served by the API under /app; the local dev server when opened from disk.
+const API = window.location.protocol === "file:" ? "http://127.0.0.1:8000" : window.location.origin;
+
+// Desk branch chosen on the dashboard; the backend falls back to its default branch when unset.
+const BRANCH = localStorage.getItem("branch");
 
 function authHeaders() {
-  return {
+  const headers = {
     "Content-Type": "application/json",
     Authorization: "Bearer " + localStorage.getItem("token"),
   };
+  if (BRANCH) headers["X-Branch"] = BRANCH;
+  return headers;
+}
+
+function newIdempotencyKey() {
+  if (window.crypto?.randomUUID) return crypto.randomUUID();
+  return `${Date.now()}-${Math.random().toString(16).slice(2)}`;
+}
+
+// Write calls carry one Idempotency-Key per user action, so retrying after a
+// dropped connection replays the stored result instead of applying twice.
+async function postWithRetry(url, method, body, attempts = 3) {
+  const options = {
+    method,
+    headers: { ...authHeaders(), "Idempotency-Key": newIdempotencyKey() },
+    body: JSON.stringify(body),
+  };
+  for (let attempt = 1; ; attempt++) {
+    try {
+      return await fetch(url, options);
+    } catch (err) {
+      if (attempt >= attempts) throw err;
+      await new Promise((resolve) => setTimeout(resolve, 500 * attempt));
+    }
+  }
 }
 
 function setDashboardLink() {
@@ -63,8 +92,8 @@ async function searchAvailableBooks() {
       <th>Select</th>
       <th>Book</th>
       <th>Author</th>
-      <th>Serial No</th>
       <th>Type</th>
+      <th>Available</th>
     </tr>`;
 
   if (!res.ok) {
@@ -83,8 +112,8 @@ async function searchAvailableBooks() {
         <td><input type="radio" name="book" value="${book.id}" data-title="${book.title}" data-author="${book.author}"></td>
         <td>${book.title}</td>
         <td>${book.author}</td>
-        <td>${book.serial_no}</td>
         <td>${book.media_type}</td>
+        <td>${book.available_copies} / ${book.total_copies}</td>
       </tr>`;
   });
 
@@ -124,20 +153,16 @@ async function issueBook() {
     return;
   }
 
-  const res = await fetch(`${API}/transactions/issue-book`, {
-    method: "POST",
-    headers: authHeaders(),
-    body: JSON.stringify({
-      user_id: Number(userId),
-      book_id: Number(selected.value),
-      issue_date: issueDate,
-      return_date: returnDate,
-      remarks: remarks || null,
-    }),
+  const res = await postWithRetry(`${API}/transactions/issue-book`, "POST", {
+    user_id: Number(userId),
+    title_id: Number(selected.value),
+    issue_date: issueDate,
+    return_date: returnDate,
+    remarks: remarks || null,
   });
   const data = await res.json();
   msg.innerText = res.ok
-    ? `Book issued successfully. Transaction ID: ${data.transaction_id}`
+    ? `Book issued successfully. Transaction ID: ${data.transaction_id} | Serial No: ${data.serial_no}`
     : data.detail || "Issue failed";
 }
 
@@ -152,14 +177,10 @@ async function returnBook() {
     return;
   }
 
-  const res = await fetch(`${API}/transactions/return-book`, {
-    method: "POST",
-    headers: authHeaders(),
-    body: JSON.stringify({
-      transaction_id: Number(transactionId),
-      serial_no: serialNo,
-      return_date: returnDate,
-    }),
+  const res = await postWithRetry(`${API}/transactions/return-book`, "POST", {
+    transaction_id: Number(transactionId),
+    serial_no: serialNo,
+    return_date: returnDate,
   });
   const data = await res.json();
   if (!res.ok) {
@@ -182,19 +203,41 @@ async function payFine() {
     return;
   }
 
-  const res = await fetch(`${API}/transactions/pay-fine`, {
-    method: "POST",
-    headers: authHeaders(),
-    body: JSON.stringify({
-      transaction_id: Number(txnId),
-      fine_paid: finePaid,
-      remarks: remarks || null,
-    }),
+  const res = await postWithRetry(`${API}/transactions/pay-fine`, "POST", {
+    transaction_id: Number(txnId),
+    fine_paid: finePaid,
+    remarks: remarks || null,
   });
   const data = await res.json();
   msg.innerText = res.ok ? data.message : data.detail || "Payment failed";
 }
 
+// Rows currently shown on the live list pages, keyed by transaction id.
+const liveRows = new Map();
+let circulationFeed = null;
+
+// Follow the circulation change feed from `seq`, the X-Event-Seq returned with
+// the initial list, so the page applies deltas instead of refetching the list.
+function followCirculation(seq, handlers) {
+  if (circulationFeed) circulationFeed.close();
+  const query = new URLSearchParams({ after: seq || "0", access_token: localStorage.getItem("token") });
+  if (BRANCH) query.set("branch", BRANCH);
+  circulationFeed = new EventSource(`${API}/transactions/events?${query.toString()}`);
+  Object.entries(handlers).forEach(([type, handler]) => {
+    circulationFeed.addEventListener(type, (e) => handler(JSON.parse(e.data)));
+  });
+}
+
+function renderActiveIssues() {
+  const msg = document.getElementById("msg");
+  const list = document.getElementById("activeList");
+  list.innerHTML = "";
+  if (msg) msg.innerText = liveRows.size ? "" : "No active issues found.";
+  liveRows.forEach((t) => {
+    list.innerHTML += `<li class="list-group-item">Txn ${t.transaction_id} | User ${t.user_id} | Book ${t.book_id} | Due ${t.due_date}</li>`;
+  });
+}
+
 async function loadActiveIssues() {
   const msg = document.getElementById("msg");
   if (msg) msg.innerText = "";
@@ -206,35 +249,54 @@ async function loadActiveIssues() {
     if (msg) msg.innerText = data.detail || "Unable to load active issues";
     return;
   }
-  if (!data.length) {
-    if (msg) msg.innerText = "No active issues found.";
-    return;
-  }
-  data.forEach((t) => {
-    list.innerHTML += `<li class="list-group-item">Txn ${t.transaction_id} | User ${t.user_id} | Book ${t.book_id} | Due ${t.due_date}</li>`;
+  liveRows.clear();
+  data.forEach((t) => liveRows.set(t.transaction_id, t));
+  renderActiveIssues();
+
+  followCirculation(res.headers.get("X-Event-Seq"), {
+    issued: (e) => {
+      liveRows.set(e.transaction_id, e);
+      renderActiveIssues();
+    },
+    returned: (e) => {
+      if (liveRows.delete(e.transaction_id)) renderActiveIssues();
+    },
   });
 }
 
-async function loadOverdueReturns() {
+function renderOverdueReturns() {
   const msg = document.getElementById("msg");
-  if (msg) msg.innerText = "";
-  const res = await fetch(`${API}/transactions/overdue-returns`, { headers: authHeaders() });
-  const data = await res.json();
   const table = document.getElementById("overdueTable");
   table.innerHTML = `
     <tr>
       <th>Transaction</th><th>User</th><th>Book</th><th>Due Date</th><th>Days Late</th><th>Fine</th>
     </tr>`;
+  if (msg) msg.innerText = liveRows.size ? "" : "No overdue returns found.";
+  liveRows.forEach((t) => {
+    table.innerHTML += `<tr><td>${t.transaction_id}</td><td>${t.user_id}</td><td>${t.book_id}</td><td>${t.due_date}</td><td>${t.days_late}</td><td>${t.fine}</td></tr>`;
+  });
+}
+
+async function loadOverdueReturns() {
+  const msg = document.getElementById("msg");
+  if (msg) msg.innerText = "";
+  const res = await fetch(`${API}/transactions/overdue-returns`, { headers: authHeaders() });
+  const data = await res.json();
   if (!res.ok) {
+    liveRows.clear();
+    renderOverdueReturns();
     if (msg) msg.innerText = data.detail || "Unable to load overdue returns";
     return;
   }
-  if (!data.length) {
-    if (msg) msg.innerText = "No overdue returns found.";
-    return;
-  }
-  data.forEach((t) => {
-    table.innerHTML += `<tr><td>${t.transaction_id}</td><td>${t.user_id}</td><td>${t.book_id}</td><td>${t.due_date}</td><td>${t.days_late}</td><td>${t.fine}</td></tr>`;
+  liveRows.clear();
+  data.forEach((t) => liveRows.set(t.transaction_id, t));
+  renderOverdueReturns();
+
+  // New issues are never overdue, so only returns change this list.
+  followCirculation(res.headers.get("X-Event-Seq"), {
+    returned: (e) => {
+      if (liveRows.delete(e.transaction_id)) renderOverdueReturns();
+    },
   });
 }
 